@@ -0,0 +1,59 @@
+from core.Corpus import CorpusIndex, dimacs_to_instance, instance_to_dimacs, read_header
+
+import os
+import argparse
+
+ap = argparse.ArgumentParser(description="Conversion and querying of corpora of instances in the binary format.")
+sub = ap.add_subparsers(dest="command", required=True)
+
+to_binary = sub.add_parser("to-binary", help="Convert DIMACS CNF files to binary instances, added to a corpus.")
+to_binary.add_argument("files", nargs="+", help="DIMACS CNF files (optionally compressed).")
+to_binary.add_argument("-d", "--dir", required=True, help="Path to the directory of the corpus.")
+to_binary.add_argument("-b", "--bias", required=False, type=float, default=float("nan"),
+                       help="The bias with which the instances were generated, if known.")
+
+to_dimacs = sub.add_parser("to-dimacs", help="Convert binary instances to DIMACS CNF files.")
+to_dimacs.add_argument("files", nargs="+", help="Binary instance files.")
+to_dimacs.add_argument("-d", "--dir", required=True, help="Path to directory where to save CNF files.")
+to_dimacs.add_argument("--compress", required=False, choices=["gzip", "xz", "zstd"], default=None,
+                       help="Compression with which to save CNF files.")
+
+index = sub.add_parser("index", help="Rebuild the index of a corpus from the headers of its instances.")
+index.add_argument("-d", "--dir", required=True, help="Path to the directory of the corpus.")
+
+query = sub.add_parser("query", help="List the instances of a corpus matching every given condition.")
+query.add_argument("-d", "--dir", required=True, help="Path to the directory of the corpus.")
+query.add_argument("conditions", nargs="*",
+                   help="Conditions as field=value, field_min=value or field_max=value (eg. k=5 m_min=1000).")
+args = vars(ap.parse_args())
+
+if __name__ == "__main__":
+    if args["command"] == "to-binary":
+        corpus = CorpusIndex(args["dir"])
+        for cnf_path in args["files"]:
+            name = os.path.basename(cnf_path)
+            name = name[:name.rindex(".cnf")] + ".rsat"
+
+            header = dimacs_to_instance(cnf_path, os.path.join(args["dir"], name), args["bias"])
+            corpus.add(name, header)
+            print(name + " : n_vars = " + str(header["n_vars"]) + ", n_clauses = " + str(header["m"]))
+    elif args["command"] == "to-dimacs":
+        # files are named after the time at which their instance was generated, suffixed by the name of the instance
+        # file (such that instances generated in the same second do not collide)
+        for path in args["files"]:
+            name = os.path.basename(path)
+            print(instance_to_dimacs(path, args["dir"], "_" + name[:name.rindex(".")], args["compress"]))
+    elif args["command"] == "index":
+        corpus = CorpusIndex(args["dir"])
+        corpus.rebuild()
+        print("Indexed " + str(len(corpus)) + " instances...")
+    else:
+        conditions = {}
+        for condition in args["conditions"]:
+            field, value = condition.split("=", 1)
+            conditions[field] = float(value)
+
+        for path in CorpusIndex(args["dir"]).query(**conditions):
+            header = read_header(path)
+            print(path + " : n_vars = " + str(header["n_vars"]) + ", k = " + str(header["k"]) + ", n_clauses = "
+                  + str(header["m"]) + ", seed = " + str(header["seed"]))
@@ -0,0 +1,204 @@
+import numpy as np
+
+from core.CoreUtils import VarPool, add_clause, generate_clauses, max_var_clauses, to_dimacs_cnf
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import datetime
+import tempfile
+import itertools
+import tracemalloc
+
+ap = argparse.ArgumentParser(description="Micro-benchmarks of clause generation and DIMACS serialisation.")
+sub = ap.add_subparsers(dest="command", required=True)
+
+run = sub.add_parser("run", help="Run the benchmarks over a grid of parameters, saving the results as JSON.")
+run.add_argument("-n", "--vars", required=False, type=int, nargs="+", default=[10**3, 10**4, 10**5, 10**6, 10**7],
+                 help="The numbers of variables in an instance.")
+run.add_argument("-k", "--literals", required=False, type=int, nargs="+", default=[3, 5, 7],
+                 help="The numbers of literals in a clause.")
+run.add_argument("-b", "--bias", required=False, type=float, nargs="+", default=[1.0, 0.1],
+                 help="The biases with which variables are pruned once the ALLL conditions are broken.")
+run.add_argument("-c", "--cutoff", required=False, type=int, nargs="+", default=[10000],
+                 help="The maximum numbers of clause generation resamples.")
+run.add_argument("-r", "--reps", required=False, type=int, default=3,
+                 help="The minimum number of timed repetitions of every benchmark (the fastest is reported).")
+run.add_argument("--min-time", required=False, type=float, default=1.0,
+                 help="The minimum total time in seconds of the repetitions of every benchmark, such that benchmarks "
+                      "of small instances are repeated enough to be stable.")
+run.add_argument("--index", required=False, choices=["hash", "bloom"], default="hash",
+                 help="Clause uniqueness index of the batch generator.")
+run.add_argument("--compress", required=False, choices=["gzip", "xz", "zstd"], default=None,
+                 help="Compression with which to benchmark DIMACS serialisation.")
+run.add_argument("--legacy-max-n", required=False, type=int, default=10**4,
+                 help="The maximum number of variables for which the per-clause generator (add_clause) is also "
+                      "benchmarked.")
+run.add_argument("--seed", required=False, type=int, default=0, help="Seed from which every instance is generated.")
+run.add_argument("-o", "--output", required=True, help="Path to the JSON file in which to save the results.")
+
+compare = sub.add_parser("compare", help="Compare two result files, flagging regressions of the second.")
+compare.add_argument("baseline", help="JSON results of the baseline.")
+compare.add_argument("results", help="JSON results to compare against the baseline.")
+compare.add_argument("-T", "--threshold", required=False, type=float, default=0.1,
+                     help="Relative slowdown (or growth in peak memory) beyond which a benchmark is flagged.")
+args = vars(ap.parse_args())
+
+"""
+Set of clauses counting the membership tests of clauses already in the set, ie. the candidate clauses rejected as
+duplicates by add_clause.
+"""
+class _CountingSet(set):
+    n_collisions = 0
+
+    def __contains__(self, clause):
+        found = super().__contains__(clause)
+        if found:
+            self.n_collisions = self.n_collisions + 1
+
+        return found
+
+
+"""
+Generates an instance through the per-clause generator, in the manner of the original generation loop: clauses are
+added through add_clause until too few variables are available or the maximum number of resamples is reached.
+
+Returns the list of clauses along with the number of candidate clauses rejected as duplicates.
+"""
+def generate_legacy(n_vars, k, bias, cutoff, seed):
+    rng = random.Random(seed)
+    vars = VarPool(n_vars)
+    var_counts = [0] * n_vars
+    clauses_arr = _CountingSet()
+
+    while k < len(vars):
+        clause, _, _, failed = add_clause(vars, var_counts, k, max_var_clauses(k), bias, clauses_arr, cutoff, rng)
+        if failed:
+            break
+
+        clauses_arr.add(clause)
+
+    return [sorted(c) for c in clauses_arr], clauses_arr.n_collisions
+
+
+def generate(generator, n_vars, k, bias, cutoff, seed):
+    if generator == "legacy":
+        return generate_legacy(n_vars, k, bias, cutoff, seed)
+
+    clauses_arr, _, n_collisions = generate_clauses(n_vars, k, max_var_clauses(k), bias, cutoff, index=args["index"],
+                                                    seed=seed)
+
+    return clauses_arr, n_collisions
+
+
+"""
+Runs the benchmarks of a single point of the grid, for the given generator ("batch" for generate_clauses or "legacy"
+for add_clause): the fastest of the timed repetitions of generation and of serialisation (to_dimacs_cnf) is reported,
+while peak memory is measured in a separate (slower) repetition traced by tracemalloc. Benchmarks are repeated at
+least the requested number of times, and until their total time reaches the requested minimum.
+"""
+def bench(generator, n_vars, k, bias, cutoff, tmp_dir):
+    gen_times, write_times = [], []
+    rep = 0
+    while rep < args["reps"] or sum(gen_times) + sum(write_times) < args["min_time"]:
+        start = time.perf_counter()
+        clauses_arr, n_collisions = generate(generator, n_vars, k, bias, cutoff, args["seed"] + rep)
+        gen_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        cnf_file_name = to_dimacs_cnf(clauses_arr, n_vars, tmp_dir + "/", "_" + str(rep), args["compress"])
+        write_times.append(time.perf_counter() - start)
+
+        size = 0
+        for entry in os.scandir(tmp_dir):
+            if entry.path.startswith(cnf_file_name):
+                size = size + entry.stat().st_size
+                os.remove(entry.path)
+
+        rep = rep + 1
+
+    tracemalloc.start()
+    clauses_arr, _ = generate(generator, n_vars, k, bias, cutoff, args["seed"])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    gen_time, write_time = min(gen_times), min(write_times)
+
+    return {"generator": generator, "n": n_vars, "k": k, "bias": bias, "cutoff": cutoff, "clauses": len(clauses_arr),
+            "collisions": int(n_collisions), "gen_time": gen_time, "clauses_per_sec": len(clauses_arr) / gen_time,
+            "peak_bytes": peak, "bytes": size, "write_time": write_time, "bytes_per_sec": size / write_time}
+
+
+"""
+Key identifying a benchmark across result files.
+"""
+def bench_key(result):
+    return result["generator"], result["n"], result["k"], result["bias"], result["cutoff"]
+
+
+"""
+Compares the results of two runs of the benchmarks, returning the list of (key, metric, baseline value, value) of
+every metric regressing by more than the threshold: a drop in generation or serialisation throughput, or a growth in
+peak memory.
+"""
+def find_regressions(baseline, results, threshold):
+    regressions = []
+    baseline = {bench_key(r): r for r in baseline["results"]}
+
+    for result in results["results"]:
+        base = baseline.get(bench_key(result))
+        if base is None:
+            continue
+
+        for metric in ["clauses_per_sec", "bytes_per_sec"]:
+            if result[metric] < (1 - threshold) * base[metric]:
+                regressions.append((bench_key(result), metric, base[metric], result[metric]))
+
+        if (1 + threshold) * base["peak_bytes"] < result["peak_bytes"]:
+            regressions.append((bench_key(result), "peak_bytes", base["peak_bytes"], result["peak_bytes"]))
+
+    return regressions
+
+
+if __name__ == "__main__":
+    if args["command"] == "run":
+        results = []
+        tmp_dir = tempfile.mkdtemp(prefix="RandomSATGen_bench_")
+        try:
+            for n_vars, k, bias, cutoff in itertools.product(args["vars"], args["literals"], args["bias"],
+                                                              args["cutoff"]):
+                generators = ["batch"] + (["legacy"] if n_vars <= args["legacy_max_n"] else [])
+                for generator in generators:
+                    result = bench(generator, n_vars, k, bias, cutoff, tmp_dir)
+                    results.append(result)
+
+                    print("%s n = %d, k = %d, b = %g, c = %d : %d clauses, %.0f clauses/s, %.1f MB/s, %.1f MB peak"
+                          % (generator, n_vars, k, bias, cutoff, result["clauses"], result["clauses_per_sec"],
+                             result["bytes_per_sec"] / 2**20, result["peak_bytes"] / 2**20))
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        meta = {"time": datetime.datetime.now().isoformat(), "python": platform.python_version(),
+                "numpy": np.__version__, "machine": platform.machine(), "processor": platform.processor(),
+                "index": args["index"], "compress": args["compress"], "reps": args["reps"], "seed": args["seed"]}
+
+        with open(args["output"], "w") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=1)
+    else:
+        with open(args["baseline"]) as f:
+            baseline = json.load(f)
+        with open(args["results"]) as f:
+            results = json.load(f)
+
+        regressions = find_regressions(baseline, results, args["threshold"])
+        for key, metric, base, value in regressions:
+            print("REGRESSION %s n = %d, k = %d, b = %g, c = %d : %s %.4g -> %.4g (%+.1f%%)"
+                  % (key + (metric, base, value, 100 * (value - base) / base)))
+
+        print(str(len(regressions)) + " regressions found...")
+        sys.exit(1 if regressions else 0)
@@ -1,15 +1,20 @@
 import numpy as np
 
-from core.CoreUtils import add_clause, to_dimacs_cnf
-from matplotlib import pyplot as plt
+from core.Sweep import SEARCHES, merge_shards, run_shard, run_sweep
+from core.Stats import CIRepetitions, mean_ci
+from core.Store import ResultStore, solver_hash
+from core.Shard import ShardLog, parse_shard
+from core.Dependency import FIELDS
+from core.Plots import render, write_meta
+from core.Instances import InstanceCache
+from core.Metrics import PROFILERS, PrometheusExporter
+from core.Affinity import CoreAllocator
+from core.Transport import TRANSPORTS, select_transport
 
-import os
 import csv
 import math
-import time
 import random
 import argparse
-import subprocess
 
 ap = argparse.ArgumentParser()
 ap.add_argument("-n", "--vars", required=True, type=int, help="The maximum number of variables in an instance.")
@@ -19,154 +24,267 @@ ap.add_argument("-kS", "--k-step", required=False, type=int, help="Step between
 ap.add_argument("-i", "--iterations", required=True, type=int, help="The maximum number of sequential solve iterations.")
 ap.add_argument("-c", "--cutoff", required=False, type=int, help="The maximum number of clause generation resamples.",
                 default=10000)
+ap.add_argument("--index", required=False, choices=["hash", "bloom"], default="hash",
+                help="Clause uniqueness index; 'bloom' uses less memory but may rarely reject a unique clause.")
 ap.add_argument("-N", "--samples", required=False, type=int,
                 help="The number of samples equally spaced between 0 and 1.", default=100)
 ap.add_argument("-s", "--solver", required=True, help="Path to a solver instance accepting a DIMACS CNF file as input.")
-ap.add_argument("-p", "--threads", required=True, type=int, default=2, help="Number of threads of use")
+ap.add_argument("-p", "--threads", required=True, type=int, nargs="+", default=[2],
+                help="Number of threads of use; several values sweep the thread counts on the same instances")
 ap.add_argument("-d", "--dir", required=True, help="Path to directory where to save CNF files.")
+ap.add_argument("--backend", required=False, choices=["external", "cross-check"], default="external",
+                help="Solver backend: the external solvers alone, or cross-checking the iteration counts of the serial "
+                     "solver against the in-process reference Moser-Tardos solver.")
+ap.add_argument("--transport", required=False, choices=TRANSPORTS, default="auto",
+                help="How instances are passed to the solver; 'auto' selects the fastest supported by the solver.")
 ap.add_argument("-t", "--timeout", required=False, type=int, help="Timeout in seconds.", default=30)
+ap.add_argument("-j", "--jobs", required=False, type=int, default=0,
+                help="Number of cells of the sweep to run in parallel, each on its own cores (default: as many as "
+                     "fit).")
+ap.add_argument("--search", required=False, choices=SEARCHES, default="linear",
+                help="How bias values are chosen; 'adaptive' locates b_max by bisection and then samples below it.")
+ap.add_argument("--budget", required=False, type=int, default=16,
+                help="The number of bias values evaluated for every k by the adaptive search.")
+ap.add_argument("-r", "--reps", required=False, type=int, default=10,
+                help="The number of repetitions of every bias value, unless repeating until --ci-width is met.")
+ap.add_argument("--ci-width", required=False, type=float, default=None,
+                help="Repeat every bias value until the confidence intervals on the mean solve time and iterations are "
+                     "within this width relative to the mean (eg. 0.1), between --min-reps and --max-reps repetitions.")
+ap.add_argument("--min-reps", required=False, type=int, default=3,
+                help="The minimum number of repetitions with --ci-width.")
+ap.add_argument("--max-reps", required=False, type=int, default=30,
+                help="The maximum number of repetitions with --ci-width.")
+ap.add_argument("--confidence", required=False, type=float, default=0.95, help="The confidence level of the intervals.")
+ap.add_argument("--store", required=False, default=None,
+                help="Path to the database recording every run, from which an interrupted sweep is resumed when run "
+                     "again with the same arguments (default: results.sqlite in the directory of CNF files).")
+ap.add_argument("--seed", required=False, type=int, default=None,
+                help="Master seed from which every instance is generated (default: the seed recorded in the results "
+                     "database, or a fresh seed).")
+ap.add_argument("--instance-cache", required=False, default=None,
+                help="Directory in which to keep generated instances, such that they are not generated again when run "
+                     "against another solver build.")
+ap.add_argument("--instance-cache-size", required=False, type=int, default=1024,
+                help="The maximum size in MB of the instances kept in --instance-cache.")
+ap.add_argument("--events", required=False, default=None,
+                help="Path to a JSON-lines log to which the phase timings, counters and memory high-water marks of "
+                     "every cell are appended.")
+ap.add_argument("--prometheus", required=False, default=None,
+                help="Path to a Prometheus textfile exporting the aggregated event log, updated as cells finish "
+                     "(logging events to events.jsonl in the directory of CNF files unless --events is given).")
+ap.add_argument("--profile", required=False, choices=PROFILERS, default=None,
+                help="Profile a single cell of the sweep, saving the profile in the directory of CNF files.")
+ap.add_argument("--profile-cell", required=False, type=int, nargs=3, default=None, metavar=("K", "BIAS", "REP"),
+                help="The cell to profile, as its k, the index of its bias value and its repetition (default: the "
+                     "first cell).")
+ap.add_argument("--no-plot", required=False, action="store_true",
+                help="Only record the results, leaving them to be plotted by Render.py.")
+ap.add_argument("--plot-jobs", required=False, type=int, default=1,
+                help="Number of processes plotting the results of every k once the sweep is done.")
+ap.add_argument("--shard", required=False, type=parse_shard, default=None, metavar="i/N",
+                help="Only run the i-th of N shards of the sweep (eg. 1/4), coordinating with the other shards through "
+                     "--shard-dir, such that the sweep is spread over several nodes; combine the results with --merge.")
+ap.add_argument("--shard-dir", required=False, default=None,
+                help="Directory shared by all shards, holding the parameters of the sweep and the work log of every "
+                     "shard (default: shards in the directory of CNF files).")
+ap.add_argument("--merge", required=False, action="store_true",
+                help="Merge the work logs of all shards in --shard-dir into the results of every k, once all shards "
+                     "are done.")
 args = vars(ap.parse_args())
 
-if __name__ == "__main__":
-    random.seed()
-
-    # Carry out benchmark for every number of literals k between k_min and k_max, using an interval of k_step
-    for k in range(args["k_min"], args["k_max"] + 1, args["k_step"]):
-        # Maximum number of clauses a variable can appear in without breaking the ALLL conditions
-        max_var_clauses = math.floor(math.pow(2, k) / (k * math.e))
-
-        # Initialise data collection structures...
-        b_arr = []   # Store bias values b
-        ts_arr = []  # Store average serial solve times ts
-        tp_arr = []  # Store average parallel solve times tp
-        m_arr = []   # Store average number of clauses m
-
-        b_max = 0  # Maximum bias value before solve time timeout reached...
-
-        # For every geometrically spaced bias value (ie. we vary the degree by which the ALLL conditions are broken and
-        # record the behaviour of both serial and parallel solvers through the various statistics recorded)
-        for b in np.geomspace(1, 1/args["samples"], args["samples"]):
-            # Store aggregate data to be averaged over 10 tests (in this manner we reduce noise in the data)
-            mTotal = 0
-            tsTotal = 0
-            tpTotal = 0
-            n_executions = 0
-
-            # Run benchmarks for 10 times for the given number of literals k and bias b, to average and reduce noise
-            while n_executions < 10:
-                variables = list(range(1, args["vars"] + 1))  # randomly select number of variables
-                variables_counts = [0] * len(variables)  # initialise array to hold number of clauses in which each var occurs
-
-                clauses_arr = set([])  # clauses maintained as a set; we will maintain clauses as a hashable type and in this
-                                       # manner we will ensure that each clause added is unique ie. sampling without replacement
-
-                n_clauses = 0  # maintain count of number of clauses added
-                while k < len(variables):  # while enough variables are available to form a new clause with k literals
-                    n_clauses = n_clauses + 1  # update clause count
-
-                    # fetch new clause; may update variables and variables_counts (in particular it may delete a variable from
-                    # the array, meaning that max_var_clauses has been exceeded for that variable)
-                    clause, variables, _, failed = add_clause(variables, variables_counts, k, max_var_clauses, b,
-                                                              clauses_arr, args["cutoff"])
-                    if not failed:
-                        clauses_arr.add(clause)
-                    else:
-                        break
-
-                # Convert to DIMACS format and persist to disk
-                cnf_file_name = to_dimacs_cnf(clauses_arr, args["vars"], args["dir"], "_analysis")
-
-                time.sleep(1)  # Wait until write is completed
-
-                try:  # Attempt to solve using serial solver; if timeout, a TimeoutExpired exception is thrown
-                    solver = [args["solver"], "-o", cnf_file_name + ".cnf"]
-                    subprocess.run(solver, timeout=args["timeout"])
-                except subprocess.TimeoutExpired:  # if timeout occured, clear any data related to SAT instance from disk
-                    os.remove(cnf_file_name + ".cnf")
-                    os.remove(cnf_file_name + ".csv")
-                    os.remove(cnf_file_name + ".out")
-
-                    b_max = b  # store value of bias before timeout (no further analysis will be carried out)
-                    break
-
-                os.remove(cnf_file_name + ".out")  # Clean-up any files no longer required
-
-                # read stats from csv: [0] t_read, [1] n, [2] m, [3] l, [4] t_solve, [5] n_threads, [6] n_iterations
-                stats_serial = np.genfromtxt(cnf_file_name + ".csv", delimiter=",",
-                                             dtype=[float, int, int, int, float, int, int])
-                stats_serial = np.atleast_1d(stats_serial)
-                os.remove(cnf_file_name + ".csv")  # Clean-up any files no longer required
-
-                try:  # Attempt to solve using parallel solver; if timeout, a TimeoutExpired exception is thrown
-                    solver = [args["solver"], "-o", "-p", str(args["threads"]), cnf_file_name + ".cnf"]
-                    subprocess.run(solver, timeout=args["timeout"])
-                except subprocess.TimeoutExpired:  # if timeout occured, clear any data related to SAT instance from disk
-                    os.remove(cnf_file_name + ".cnf")
-                    os.remove(cnf_file_name + ".csv")
-                    os.remove(cnf_file_name + ".out")
-
-                    b_max = b  # store value of bias before timeout (no further analysis will be carried out)
-                    break
-
-                os.remove(cnf_file_name + ".out")  # Clean-up any files no longer required
-
-                # read stats from csv: [0] t_read, [1] n, [2] m, [3] l, [4] t_solve, [5] n_threads, [6] n_iterations
-                stats_parallel = np.genfromtxt(cnf_file_name + ".csv", delimiter=",",
-                                             dtype=[float, int, int, int, float, int, int])
-                stats_parallel = np.atleast_1d(stats_parallel)
-                os.remove(cnf_file_name + ".csv")  # Clean-up any files no longer required
-
-                os.remove(cnf_file_name + ".cnf")  # Clean-up any files no longer required
-
-                # If timeout not reached but maximum number of solver iterations reached...
-                if args["iterations"] < stats_serial[0][6] or args["iterations"] < stats_parallel[0][6]:
-                    b_max = b
-                    break
-
-                # Record gathered data
-                n_executions = n_executions + 1
-                mTotal = mTotal + n_clauses
-                tsTotal = tsTotal + stats_serial[0][4]
-                tpTotal = tpTotal + stats_parallel[0][4]
-
-            if b_max == 0:  # If successfully gathered all data, average and record results
-                b_arr.append(1 - b)
-                ts_arr.append(tsTotal / n_executions)
-                tp_arr.append(tpTotal / n_executions)
-                m_arr.append(math.floor(mTotal / n_executions))
-            else:
-                break
+if args["shard"] is not None and args["merge"]:
+    ap.error("--shard and --merge are exclusive")
+if (args["shard"] is not None or args["merge"]) and (args["ci_width"] is not None or args["search"] != "linear"):
+    ap.error("sharded sweeps require a fixed number of repetitions and the linear search")
+
+biases = np.geomspace(1, 1/args["samples"], args["samples"])  # geometrically spaced bias values to analyse
+recorded = []  # names of the CSV files recorded for every k, plotted once the sweep is done
+
+"""
+Responsible for recording the results of the analysis for a given number of literals k, once all cells of the sweep
+for k are done: the serial and parallel results of every bias value are averaged, stored in a CSV file (as the rows
+[b_arr, ts_arr, tp_arr for every p, m_arr], followed by the variance and then the confidence interval half-width of
+the serial and every parallel solve time, the number of repetitions and the average maximum dependency degree and
+effective violation delta of the instances, see analyse) along with the raw results of every run (including the
+summary of the dependency structure of every instance) and the parameters needed to plot them (see plot_parallel).
+
+If several thread counts are analysed, the speedup S = ts / tp and efficiency E = S / p of each thread count p are
+additionally stored (as the rows [b_arr, S for every p, E for every p]), to be plotted against the thread counts.
+
+Parameters:
+  i.       k : the number of literals in a clause
+ ii.      bs : bias values before b_max at which all cells passed, in order
+iii. results : list of cell results (number of clauses, solver statistics, dependency structure) for each bias value
+               in bs
+ iv.   b_max : maximum bias value before solve time timeout or maximum number of iterations reached (0 if never reached)
+"""
+def record_k(k, bs, results, b_max):
+    threads = args["threads"]
+
+    # Initialise data collection structures...
+    b_arr = []   # Store bias values b
+    ts_arr = []  # Store average serial solve times ts
+    tp_arr = [[] for _ in threads]  # Store average parallel solve times tp, for every number of threads
+    m_arr = []   # Store average number of clauses m
+    var_arr = [[] for _ in range(1 + len(threads))]  # Store variance of serial and parallel solve times
+    ci_arr = [[] for _ in range(1 + len(threads))]   # Store confidence interval half-width of serial and parallel times
+    n_arr = []   # Store number of repetitions
+    d_arr = []   # Store average maximum dependency degree d_max
+    delta_arr = []  # Store average effective violation delta of the Lovasz Local Lemma condition
+    runs = [[] for _ in range(3 + 3 * len(threads) + 4 + len(FIELDS))]  # Store raw per-run bias values, solve times,
+                                                                        # number of clauses, solver CPU times, maximum
+                                                                        # resident set sizes, serial and reference
+                                                                        # solver iterations and every field of the
+                                                                        # dependency structure summary
+
+    # Average the data gathered over the repetitions of every bias value (in this manner we reduce noise in the data)
+    for b, cells in zip(bs, results):
+        # stats read from csv: [0] t_read, [1] n, [2] m, [3] l, [4] t_solve, [5] n_threads, [6] n_iterations, followed
+        # by the solver's resource usage: [7] cpu_time, [8] max_rss (missing for runs recorded without it)
+        b_arr.append(1 - b)
+        m_arr.append(math.floor(sum(n_clauses for n_clauses, _, _ in cells) / len(cells)))
+        n_arr.append(len(cells))
+
+        for j, arr in enumerate([ts_arr] + tp_arr):
+            mean, variance, half_width = mean_ci([stats[j][4] for _, stats, _ in cells], args["confidence"])
+            arr.append(mean)
+            var_arr[j].append(variance)
+            ci_arr[j].append(half_width)
+
+        n_solvers = 1 + len(threads)
+        for n_clauses, stats, structure in cells:
+            runs[0].append(1 - b)
+            for j in range(n_solvers):
+                runs[1 + j].append(stats[j][4])
+                runs[2 + n_solvers + j].append(stats[j][7] if len(stats[j]) > 7 else math.nan)
+                runs[2 + 2 * n_solvers + j].append(stats[j][8] if len(stats[j]) > 8 else math.nan)
+            runs[1 + n_solvers].append(n_clauses)
+            runs[2 + 3 * n_solvers].append(stats[0][6])
+            runs[3 + 3 * n_solvers].append(stats[n_solvers][6] if n_solvers < len(stats) else math.nan)
+            for j, field in enumerate(FIELDS):  # missing for runs recorded without it
+                runs[4 + 3 * n_solvers + j].append(math.nan if structure is None else structure[field])
+
+        d_arr.append(np.mean(runs[4 + 3 * n_solvers + FIELDS.index("d_max")][-len(cells):]))
+        delta_arr.append(np.mean(runs[4 + 3 * n_solvers + FIELDS.index("delta")][-len(cells):]))
+
+    # Store results in a CSV file, for possible further future analysis, along with the raw results of every run
+    csv_name = args["dir"] + "parallel_analysis_n" + str(args["vars"]) + "_k" + str(k)
+    with open(csv_name + ".csv", "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerows([b_arr, ts_arr] + tp_arr + [m_arr] + var_arr + ci_arr + [n_arr, d_arr, delta_arr])
+
+    with open(csv_name + "_runs.csv", "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerows(runs)
+
+    if args["backend"] == "cross-check":
+        print("k = %d : serial / reference iterations = %.3f..."
+              % (k, sum(runs[5 + 3 * len(threads)]) / max(sum(runs[6 + 3 * len(threads)]), 1)))
+
+    write_meta(csv_name, {"n": args["vars"], "k": k, "samples": args["samples"], "b_max": float(b_max),
+                          "backend": args["backend"], "threads": threads})
+    recorded.append(csv_name)
+
+    if len(threads) == 1:
+        return
+
+    # =========================================== Speedup and Efficiency ===========================================
+
+    speedup = np.divide(ts_arr, np.array(tp_arr)).T  # speedup for every bias value (rows) and number of threads
+    efficiency = speedup / np.array(threads)
+
+    csv_name = args["dir"] + "parallel_speedup_n" + str(args["vars"]) + "_k" + str(k) + ".csv"
+    with open(csv_name, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerows([b_arr] + speedup.T.tolist() + efficiency.T.tolist())
 
-        # Store results in a CSV file, for possible further future analysis
-        csv_name = args["dir"] + "parallel_analysis_n" + str(args["vars"]) + "_k" + str(k) + ".csv"
-        with open(csv_name, "w", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerows([b_arr, ts_arr, tp_arr,  m_arr])
 
-        # ================================================== Plotting ==================================================
+if __name__ == "__main__":
+    random.seed()
 
-        if b_max != 0:
-            E = 1 - b_max
+    # Every instance is solved by the serial solver and then by the parallel solver for every number of threads, with
+    # every solver pinned to as many cores as it has threads
+    serial_solver = [args["solver"], "-o"]
+    parallel_solvers = [[args["solver"], "-o", "-p", str(p)] for p in args["threads"]]
+    transport = None
+    if not args["merge"]:  # results are only merged, such that the solvers are never run
+        transport = select_transport(args["transport"], serial_solver, args["dir"])
+
+    cfg = {"vars": args["vars"], "cutoff": args["cutoff"], "index": args["index"], "dir": args["dir"],
+           "transport": transport,
+           "solvers": [serial_solver] + parallel_solvers, "cores": [1] + args["threads"],
+           "timeout": args["timeout"], "iterations": args["iterations"], "backend": args["backend"]}
+
+    # Cells run at once on disjoint sets of cores, such that the machine is never oversubscribed
+    allocator = CoreAllocator()
+    if allocator.n_cpus < max(args["threads"]):
+        ap.error("more threads requested than the " + str(allocator.n_cpus) + " available cores")
+
+    jobs = args["jobs"] if 0 < args["jobs"] else allocator.n_cpus // max(args["threads"])
+
+    # For every geometrically spaced bias value (ie. we vary the degree by which the ALLL conditions are broken and
+    # record the behaviour of both serial and parallel solvers through the various statistics recorded), run benchmarks
+    # repeatedly for every number of literals k between k_min and k_max (using an interval of k_step), until the solve
+    # time timeout or the maximum number of solver iterations is reached
+    ks = list(range(args["k_min"], args["k_max"] + 1, args["k_step"]))
+    reps = args["reps"]
+    if args["ci_width"] is not None:
+        reps = CIRepetitions(args["min_reps"], args["max_reps"], args["ci_width"], args["confidence"])
+
+    # Every run is recorded as it finishes, such that the sweep resumes where it stopped if run again: in the results
+    # database, or in the work log of the shard if the sweep is sharded over several nodes
+    sharded = args["shard"] is not None or args["merge"]
+    if sharded:
+        store = ShardLog(args["shard_dir"] or args["dir"] + "shards/", args["shard"])
+    else:
+        store = ResultStore(args["store"] or args["dir"] + "results.sqlite")
+
+    with store:
+        # Every instance is generated from a seed derived from the master seed, such that the same grid of instances
+        # is run again (eg. against another solver build) given the same master seed; every shard runs the grid of the
+        # master seed and parameters published by the first shard to start
+        if sharded:
+            params = {"n": args["vars"], "ks": ks, "cutoff": args["cutoff"], "index": args["index"],
+                      "timeout": args["timeout"], "iterations": args["iterations"], "samples": args["samples"],
+                      "reps": reps, "solver": solver_hash(cfg["solvers"], args["backend"], args["iterations"])}
+            if args["shard"] is not None:  # the merge combines the logs of all shards, whatever their number
+                params["shards"] = args["shard"][1]
+
+            try:
+                seed = store.master_seed(args["seed"], **params)
+            except ValueError as e:
+                ap.error(str(e))
         else:
-            E = 1 - (1 / args["samples"])
+            seed = store.master_seed(args["seed"])
+        print("Master seed " + str(seed) + "...")
 
-        ttl = "n = " + str(args["vars"]) + ", k = " + str(k) + ", $\delta_{\mathrm{max}}$ = " + str(E)
+        if args["merge"]:
+            for k in merge_shards(cfg, ks, biases, reps, store.results(), record_k):
+                print("k = %d : not all shards are done, skipping..." % k)
+        else:
+            # Every cell is instrumented if an event log is requested, and a single cell profiled if requested
+            if args["prometheus"] is not None and args["events"] is None:
+                args["events"] = args["dir"] + "events.jsonl"
+            cfg["events"] = args["events"]
 
-        fig, (ax) = plt.subplots(1, 1)
-        fig.set_canvas(plt.gcf().canvas)
-        fig.suptitle(ttl)
+            exporter = None
+            if args["prometheus"] is not None:
+                exporter = PrometheusExporter(args["events"], args["prometheus"])
 
-        ax.plot(m_arr, ts_arr, 'r+', label='Sequential ALLL')
-        ax.plot(m_arr, ts_arr, 'r')
-        ax.plot(m_arr, tp_arr, 'b+', label='Parallel ALLL')
-        ax.plot(m_arr, tp_arr, 'b')
+            if args["profile"] is not None:
+                k, bi, rep = args["profile_cell"] or (args["k_min"], 0, 0)
+                cfg["profile"] = (args["profile"], (k, biases[bi], rep))
 
-        ax.legend()
-        ax.set_xlabel('$m$' + " (clauses)")
-        ax.set_ylabel('$t$' + " (milliseconds)")
+            cfg["instances"] = InstanceCache(args["vars"], args["cutoff"], args["index"], seed, args["instance_cache"],
+                                             args["instance_cache_size"] << 20)
 
-        fig.set_size_inches(9, 6)
-        plt.tight_layout()
+            if sharded:
+                run_shard(cfg, ks, biases, reps, jobs, store, allocator, exporter)
+                print("Shard %d/%d done, merge the results with --merge once all shards are done..." % args["shard"])
+            else:
+                run_sweep(cfg, ks, biases, reps, jobs, record_k, allocator, args["search"], args["budget"], store,
+                          exporter)
 
-        pdf_name = args["dir"] + "parallel_analysis_n" + str(args["vars"]) + "_k" + str(k)
-        fig.savefig(pdf_name + ".pdf", format='pdf', bbox_inches='tight')
+    # Every k is plotted in a single batch once the sweep is done, such that matplotlib is only imported then
+    if not args["no_plot"]:
+        render(recorded, args["plot_jobs"])
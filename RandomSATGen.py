@@ -1,15 +1,19 @@
-from core.CoreUtils import add_clause, to_dimacs_cnf
-
-import numpy as np
+from core.CoreUtils import generate_clauses, compress_file
+from core.Transport import TRANSPORTS, SolverInstance, select_transport
+from core.Instances import new_master_seed, instance_seed
+from core.Corpus import CorpusIndex
+from core.Runner import SolverRunner
+from core.Metrics import PROFILERS, InstanceMetrics, PrometheusExporter, profiled
+from core.Notify import Notifier, make_sink
 
 import os
-import time
 import math
+import time
 import random
-import smtplib
-import datetime
 import argparse
-import subprocess
+import collections
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 ap = argparse.ArgumentParser()
 ap.add_argument("-n", "--vars", required=True, type=int, help="The maximum number of variables in an instance.")
@@ -18,127 +22,238 @@ ap.add_argument("-t", "--timeout", required=False, type=int, help="The timeout i
 ap.add_argument("-b", "--bias", required=False, type=float, help="The bias with which to prune a clause", default=0)
 ap.add_argument("-c", "--cutoff", required=False, type=int, help="The maximum number of clause generation resamples.",
                 default=10000)
+ap.add_argument("--index", required=False, choices=["hash", "bloom"], default="hash",
+                help="Clause uniqueness index; 'bloom' uses less memory but may rarely reject a unique clause.")
 ap.add_argument("-s", "--solver", required=True, help="Path to a solver instance accepting a DIMACS CNF file as input.")
 ap.add_argument("-o", "--opts", required=False, default="", help="Command line arguments to solver")
 ap.add_argument("-d", "--dir", required=True, help="Path to directory where to save CNF files.")
+ap.add_argument("--transport", required=False, choices=TRANSPORTS, default="auto",
+                help="How instances are passed to the solver; 'auto' selects the fastest supported by the solver.")
+ap.add_argument("--format", required=False, choices=["dimacs", "binary"], default="dimacs",
+                help="Format in which to keep solved instances; 'binary' keeps them as memory-mappable instance files "
+                     "named by their seed and indexed in the directory's corpus index.")
+ap.add_argument("--compress", required=False, choices=["gzip", "xz", "zstd"], default=None,
+                help="Compression with which to keep solved CNF files (in the dimacs format).")
+ap.add_argument("--prefetch", required=False, type=int, default=2,
+                help="The number of instances generated ahead of the solver (at least the number of generators).")
+ap.add_argument("--generators", required=False, type=int, default=1,
+                help="The number of processes generating instances ahead of the solver.")
+ap.add_argument("--runs", required=False, type=int, default=1, help="The number of solver runs in flight at once.")
+ap.add_argument("--seed", required=False, type=int, default=None,
+                help="Master seed from which every instance is generated, such that a run can be reproduced exactly.")
+ap.add_argument("--events", required=False, default=None,
+                help="Path to a JSON-lines log to which the phase timings, counters and memory high-water marks of "
+                     "every instance are appended.")
+ap.add_argument("--prometheus", required=False, default=None,
+                help="Path to a Prometheus textfile exporting the aggregated event log, updated as instances are run "
+                     "(logging events to events.jsonl in the directory of CNF files unless --events is given).")
+ap.add_argument("--profile", required=False, choices=PROFILERS, default=None,
+                help="Profile the generation and run of a single instance, saving the profiles in the directory of "
+                     "CNF files.")
+ap.add_argument("--profile-instance", required=False, type=int, default=1,
+                help="The number of the instance to profile.")
 ap.add_argument("-e", "--email", required=False, help="E-mail address for notification of instance.", default="")
 ap.add_argument("-p", "--pwd", required=False, help="Password for given E-mail address", default="")
 ap.add_argument("-S", "--smtp", required=False, help="E-mail service SMTP address", default="smtp.gmail.com")
 ap.add_argument("-P", "--port", required=False, type=int, help="E-mail service SMTP port", default=587)
+ap.add_argument("--notify", required=False, default=None,
+                help="Where to send notifications of solved instances: 'smtp' (the e-mail service, the default if an "
+                     "e-mail address is given), 'smtp://host:port' (a plain SMTP server, eg. a local stand-in), "
+                     "'file:path' or the http(s) URL of a webhook.")
+ap.add_argument("--notify-interval", required=False, type=float, default=3600,
+                help="The minimum time in seconds between notifications.")
+ap.add_argument("--notify-batch", required=False, type=int, default=None,
+                help="The number of solved instances at which a notification is sent irrespective of the interval.")
 args = vars(ap.parse_args())
 
-"""
-Responsible for running generated SAT instances, by first persisting them to disk, then calling the specified solver
-along with any parameters. A solve is attempted until a timeout is met or a successful solution is found. 
+if min(args["prefetch"], args["generators"], args["runs"]) < 1:
+    ap.error("--prefetch, --generators and --runs must be at least 1")
 
-In the case that a successful solution is found, keep the instance on disk, else delete. Optionally, the function is
-able to send an email notification periodically whenever a solution is found (useful for exploring the search space).
+if args["prometheus"] is not None and args["events"] is None:
+    args["events"] = args["dir"] + "events.jsonl"
+
+if args["notify"] is None and args["email"] != "":
+    args["notify"] = "smtp"
+
+solver = [args["solver"]] + args["opts"].split()
 
-Parameters:
-  i.    notif_counter : total time spent solving in between email notifications
- ii.             TEXT : email notification text
-iii.          clauses : randomly generated clauses representing SAT instances
- iv.           n_vars : number of variables in instance
-  v. file_name_suffix : optional argument providing suffix to name of file persisted to disk
 """
-def run_instance(notif_counter, TEXT, clauses, n_vars, file_name_suffix=""):
-    # Convert to DIMACS format and persist to disk
-    print("Writing SAT instance to file...")
-    cnf_file_name = to_dimacs_cnf(clauses, n_vars, args["dir"], file_name_suffix)
+Responsible for generating a random SAT instance and preparing it to be passed to the solver through the selected
+transport (ie. writing it to file for the tmpfs and disk transports). Called in one of the generator processes, ahead
+of the instance being run.
 
-    time.sleep(1)  # Wait until write is completed
+Parameters:
+  i.        transport : transport through which the instance is passed to the solver
+ ii. file_name_suffix : suffix to name of file persisted to disk (distinguishing instances generated in the same second)
+iii.             seed : seed from which the instance is generated
+
+Returns the instance along with its seed and the metrics of its generation (see InstanceMetrics).
+"""
+def generate_instance(transport, file_name_suffix, seed):
+    print("====================================================\nGenerating SAT instance...")
 
-    solved = False
+    number = int(file_name_suffix[1:])
+    metrics = InstanceMetrics(args["events"], instance=number, n=args["vars"], k=args["literals"], seed=seed)
+    profiler = args["profile"] if number == args["profile_instance"] else None
 
-    print("Running SAT instance...")
-    try:  # Attempt to solve; if timeout, a TimeoutExpired exception is thrown
-        solver = [args["solver"]] + args["opts"].split() + [cnf_file_name + ".cnf"]
-        subprocess.run(solver, timeout=(args["timeout"] * 60))
-        solved = True
-    except subprocess.TimeoutExpired:  # if timeout occured, clear any data related to SAT instance from disk
-        print("SAT solver timed out...")
-        os.remove(cnf_file_name + ".cnf")
-        os.remove(cnf_file_name + ".csv")
-        os.remove(cnf_file_name + ".out")
+    # maximum number of clauses in which a variable can appear in, to satisfy the ALLL conditions
+    max_var_clauses = math.floor(math.pow(2, args["literals"]) / (args["literals"] * math.e))
 
-    if solved:
-        # read stats from csv: [0] t_read, [1] n, [2] m, [3] l, [4] t_solve, [5] n_threads, [6] n_iterations
-        stats = np.genfromtxt(cnf_file_name + ".csv", delimiter=",",
-                                     dtype=[float, int, int, int, float, int, int])
-        stats = np.atleast_1d(stats)
+    bias = 1.0 / args["bias"]  # parameter controlling the 'degree' by which the ALLL conditions are broken
 
-        tD = stats[0][4]  # extract solve time
-        notif_counter = notif_counter + tD  # update counter in between solves
+    # generate unique clauses (ie. sampling without replacement) in batches, until too few variables are available
+    # to form a new clause with k literals or the maximum number of clause generation resamples is reached
+    with profiled(profiler, args["dir"] + "profile_gen" + file_name_suffix, metrics):
+        with metrics.phase("generate"):
+            clauses_arr, _, n_collisions = generate_clauses(args["vars"], args["literals"], max_var_clauses, bias,
+                                                            args["cutoff"], index=args["index"], seed=seed)
+        metrics.count("collisions", int(n_collisions))
 
-    if args["email"] != "":  # if email notifications requested
-        if solved:  # update email body with new SAT instance statistics if solved
-            TEXT = TEXT + cnf_file_name + " : n_vars = " + str(n_vars) + ", n_clauses = " + str(len(clauses)) +\
-                   ", time = " + str(tD) + " seconds\n"
+        with metrics.phase("write"):
+            instance = SolverInstance(clauses_arr, args["vars"], transport, args["dir"], file_name_suffix)
 
-        if (3600 <= notif_counter) and TEXT != "":  # if SAT instances found and time has elapsed to send notification
-            # compose email and send using the passed parameters
+    metrics.max_rss("generator_max_rss_bytes")
 
-            TEXT = "SAT instances found! Details:\n\n" + TEXT
+    return instance, seed, metrics
 
-            FROM = args["email"]
-            TO = [args["email"]]
 
-            email_time = datetime.datetime.now()
-            SUBJECT = "RandomSATGen Update (" + email_time.strftime("%d/%m/%Y %H:%M:%S") + ")"
+"""
+Responsible for running generated SAT instances, by passing them to the specified solver (along with any parameters)
+through the selected transport. A solve is attempted until a timeout is met or a successful solution is found. Called
+in one of the solver threads, such that several solver runs may be in flight at once.
 
-            message = "From: %s\nTo: %s\nSubject: %s\n\n%s" % (FROM, ", ".join(TO), SUBJECT, TEXT)
-            try:
-                server = smtplib.SMTP(args["smtp"], args["port"])
-                server.ehlo()
-                server.starttls()
-                server.login(args["email"], args["pwd"])
-                server.sendmail(FROM, TO, message)
-                server.close()
+In the case that a successful solution is found, keep the instance on disk (in the requested format, along with the
+solver's output files), else delete.
 
-                return 0, ""
-            except Exception:
-                print("Unable to communicate with mailing service")
-                exit(1)
+Parameters:
+  i. instance : generated SAT instance (SolverInstance), which is closed once run
+ ii.     seed : seed from which the instance was generated
+iii.  metrics : metrics of the instance (see generate_instance), to which the phases of its run are added
 
-    return notif_counter, TEXT
+Returns the statistics read from the solver's csv file (None if timeout occured), the name of the file persisted to
+disk (None if timeout occured) and the number of clauses in the instance.
+"""
+def run_instance(instance, seed, metrics):
+    profiler = args["profile"] if metrics.labels["instance"] == args["profile_instance"] else None
 
+    with profiled(profiler, args["dir"] + "profile_run" + instance.file_name_suffix, metrics):
+        stats, cnf_file_name = _run_instance(instance, seed, metrics)
 
-if __name__ == "__main__":
-    # Initialisation
+    metrics.emit()
 
-    TEXT = ""
-    notif_counter = 0
+    return stats, cnf_file_name, len(instance.clauses)
 
-    random.seed()
-    n_vars = args["vars"]
 
-    while 1:  # generate random SAT instances until user termination
-        print("====================================================\nGenerating SAT instance...")
+def _run_instance(instance, seed, metrics):
+    try:
+        print("Running SAT instance...")
+        run = runner.run(instance, solver, args["timeout"] * 60)  # Attempt to solve; stats are None on timeout
+        metrics.add_run(run)
+        stats = run.stats
 
-        variables = list(range(1, n_vars + 1))  # randomly select number of variables
-        variables_counts = [0] * len(variables)  # initialise array to hold number of clauses in which each var occurs
+        cnf_file_name = None
+        if stats is not None and args["format"] == "binary":  # keep the instance in the corpus, named by its seed
+            cnf_file_name = args["dir"] + "rand_n" + str(args["vars"]) + "_k" + str(args["literals"]) + "_s" \
+                            + str(seed)
+            with metrics.phase("keep"):
+                CorpusIndex(args["dir"]).write(os.path.basename(cnf_file_name) + ".rsat", instance.clauses,
+                                               args["vars"], 1.0 / args["bias"], seed, instance.gen_time, stats)
+                instance.keep_outputs(cnf_file_name)
+        elif stats is not None:  # keep the instance on disk, else any data related to it is cleared on closing it
+            with metrics.phase("keep"):
+                cnf_file_name = instance.keep(args["dir"])
+        else:
+            # the instance is not kept, but can be generated again from the master seed and its number
+            print(("SAT solver timed out" if run.timed_out else "SAT solver exited with code " + str(run.returncode)
+                   + " without statistics") + " on instance " + instance.file_name_suffix[1:] + "...")
+    finally:
+        with metrics.phase("cleanup"):
+            instance.close()
 
-        clauses_arr = set([])  # clauses maintained as a set; we will maintain clauses as a hashable type and in this
-                               # manner we will ensure that each clause added is unique ie. sampling without replacement
+    print("SAT solver used %.2f seconds of CPU time and %d KB of memory..." % (run.cpu_time, run.max_rss))
 
-        n_clauses = 0  # maintain count of number of clauses added
+    if stats is not None and args["format"] == "dimacs" and args["compress"] is not None:  # keep it compressed
+        with metrics.phase("compress"):
+            compress_file(cnf_file_name + ".cnf", args["compress"])
 
-        # maximum number of clauses in which a variable can appear in, to satisfy the ALLL conditions
-        max_var_clauses = math.floor(math.pow(2, args["literals"]) / (args["literals"] * math.e))
+    return stats, cnf_file_name
 
-        bias = 1.0 / args["bias"]  # parameter controlling the 'degree' by which the ALLL conditions are broken
 
-        while args["literals"] < len(variables):  # while enough variables are available to form a new clause with k literals
-            n_clauses = n_clauses + 1  # update clause count
+if __name__ == "__main__":
+    # Initialisation
 
-            # fetch new clause; may update variables and variables_counts (in particular it may delete a variable from
-            # the array, meaning that max_var_clauses has been exceeded for that variable)
-            clause, variables, variables_counts, failed = add_clause(variables, variables_counts, args["literals"],
-                                                                     max_var_clauses, bias, clauses_arr,
-                                                                     args["cutoff"])
-            if not failed:
-                clauses_arr.add(clause)
-            else:
-                break
+    random.seed()
+    n_vars = args["vars"]
 
-        notif_counter, TEXT = run_instance(notif_counter, TEXT, clauses_arr, n_vars)  # run generated SAT instance
+    # the seed of every instance is derived from the master seed and the instance's number (which suffixes its name),
+    # such that any instance of the run can be generated again
+    master_seed = args["seed"] if args["seed"] is not None else new_master_seed()
+    print("Master seed " + str(master_seed) + "...")
+
+    runner = SolverRunner(args["runs"])  # runs the solver on every instance, in its own process group
+
+    exporter = None
+    if args["prometheus"] is not None:
+        exporter = PrometheusExporter(args["events"], args["prometheus"])
+
+    # solved instances are notified periodically in batches by a background worker (useful for exploring the search
+    # space), such that a slow or unavailable notification service never holds up (or stops) the search
+    notifier = None
+    if args["notify"] is not None:
+        notifier = Notifier(make_sink(args["notify"], args["email"], args["pwd"], args["smtp"], args["port"]),
+                            args["notify_interval"], args["notify_batch"])
+
+    transport = select_transport(args["transport"], solver, args["dir"])
+    print("Passing SAT instances to the solver through " + transport + "...")
+
+    n_generated = 0  # number of instances submitted for generation, used to name their files uniquely
+    idle = 0  # total time solver slots spent waiting on the generation of instances
+    start = time.monotonic()
+
+    prefetch = collections.deque()  # bounded queue of instances generated ahead of the solver
+    running = set()  # solver runs in flight
+
+    # instances are generated (and written) in worker processes, each reseeded such that they do not share the random
+    # state of the parent, while solver runs block in threads
+    with ProcessPoolExecutor(args["generators"], initializer=random.seed) as generators, \
+            ThreadPoolExecutor(args["runs"]) as runners:
+        try:
+            while 1:  # generate random SAT instances until user termination
+                while len(prefetch) < args["prefetch"]:
+                    n_generated = n_generated + 1
+                    prefetch.append(generators.submit(generate_instance, transport, "_" + str(n_generated),
+                                                      instance_seed(master_seed, n_vars, args["literals"],
+                                                                    args["bias"], n_generated)))
+
+                while len(running) < args["runs"]:  # start a solver run on every free slot, once its instance is ready
+                    wait_start = time.monotonic()
+                    instance, seed, metrics = prefetch.popleft().result()
+                    idle = idle + (time.monotonic() - wait_start) * (args["runs"] - len(running))
+
+                    n_generated = n_generated + 1
+                    prefetch.append(generators.submit(generate_instance, transport, "_" + str(n_generated),
+                                                      instance_seed(master_seed, n_vars, args["literals"],
+                                                                    args["bias"], n_generated)))
+                    running.add(runners.submit(run_instance, instance, seed, metrics))
+
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stats, cnf_file_name, n_clauses = future.result()
+                    if stats is not None and notifier is not None:
+                        # stats read from csv: [0] t_read, [1] n, [2] m, [3] l, [4] t_solve, [5] n_threads,
+                        # [6] n_iterations
+                        notifier.notify(cnf_file_name + " : n_vars = " + str(n_vars) + ", n_clauses = "
+                                        + str(n_clauses) + ", time = " + str(stats[0][4]) + " seconds")
+
+                if exporter is not None:
+                    exporter.update()
+
+                print("Solver idle for %.2f seconds (%.1f%% of solver time)..."
+                      % (idle, 100 * idle / (args["runs"] * (time.monotonic() - start))))
+        finally:  # clear any data related to instances generated ahead but never run
+            for future in prefetch:
+                if not future.cancel() and future.exception() is None:
+                    future.result()[0].close()
+
+            if notifier is not None:  # send any notifications left
+                notifier.close()
@@ -0,0 +1,18 @@
+from core.Plots import find_analyses, render
+
+import argparse
+
+ap = argparse.ArgumentParser(description="Plot the results of analysis sweeps (BoundAnalysis and ParallelAnalysis).")
+ap.add_argument("-d", "--dir", required=True, help="Path to the directory of the results of the analysis sweeps.")
+ap.add_argument("-k", "--literals", required=False, type=int, nargs="+", default=None,
+                help="Only plot the results of the given values of k.")
+ap.add_argument("-j", "--jobs", required=False, type=int, default=1, help="Number of processes plotting at once.")
+args = vars(ap.parse_args())
+
+if __name__ == "__main__":
+    csv_names = find_analyses(args["dir"])
+    if args["literals"] is not None:
+        csv_names = [name for name in csv_names if int(name[name.rindex("_k") + 2:]) in args["literals"]]
+
+    for csv_name in render(csv_names, args["jobs"]):
+        print("Plotted " + csv_name + "...")
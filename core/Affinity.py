@@ -0,0 +1,31 @@
+import os
+
+"""
+Allocator of disjoint sets of cores, from the cores on which the current process is allowed to run. Every solver
+invocation pinned to an allocated set of cores (see SolverInstance.run) has those cores to itself, such that several
+invocations may run at once without oversubscribing the machine or disturbing each other's timings.
+
+Parameters:
+  i. cpus : optional list of cores to allocate from (all cores available to the process by default)
+"""
+class CoreAllocator:
+    def __init__(self, cpus=None):
+        self._free = sorted(os.sched_getaffinity(0) if cpus is None else cpus)
+        self.n_cpus = len(self._free)
+
+    def __len__(self):
+        return len(self._free)
+
+    """
+    Allocates n cores, returning the list of allocated cores or None if fewer than n cores are free.
+    """
+    def acquire(self, n):
+        if len(self._free) < n:
+            return None
+
+        cpus, self._free = self._free[:n], self._free[n:]
+
+        return cpus
+
+    def release(self, cpus):
+        self._free = sorted(self._free + list(cpus))
@@ -0,0 +1,227 @@
+import numpy as np
+
+import math
+
+"""
+Maps each row of an (m, k) array of literals, sorted in ascending order, to a canonical non-zero int64 key. Whenever
+the literals of a clause fit in 63 bits the key is an exact packed encoding of the clause; otherwise the literals are
+folded into a 64-bit hash (for which a collision between two distinct clauses is practically impossible).
+"""
+def clause_keys(lits, n_vars):
+    k = lits.shape[1]
+    u = 2 * np.abs(lits).astype(np.int64) + (lits < 0)  # literal codes in the range [2, 2n + 1]
+    bits = int(2 * n_vars + 1).bit_length()
+
+    if bits * k <= 63:
+        keys = np.zeros(len(lits), dtype=np.int64)
+        for j in range(k):
+            keys |= u[:, j] << (bits * j)
+
+        return keys
+
+    h = np.full(len(lits), 0xcbf29ce484222325, dtype=np.uint64)
+    for j in range(k):
+        h = (h ^ u[:, j].astype(np.uint64)) * np.uint64(0x100000001b3)
+
+    keys = _mix(h).view(np.int64)
+    keys[keys == 0] = 1  # 0 is reserved as the empty slot of a HashIndex
+
+    return keys
+
+
+"""
+splitmix64 finaliser, spreading the bits of an array of uint64 values over all 64 bits.
+"""
+def _mix(h):
+    h = (h ^ (h >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+    h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+
+    return h ^ (h >> np.uint64(31))
+
+
+"""
+Exact index of clause keys, as an open-addressing hash table with linear probing held in a single int64 NumPy array
+(with 0 marking an empty slot). The table is doubled whenever it becomes half full, for an overhead of at most 32 bytes
+per clause. Lookups and insertions are carried out for a whole array of keys at a time.
+
+Parameters:
+  i. capacity : initial number of keys the index can hold before growing
+"""
+class HashIndex:
+    def __init__(self, capacity=1024):
+        self._table = np.zeros(1 << max(4, (2 * capacity - 1).bit_length()), dtype=np.int64)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    """
+    Finds, for every key, either the slot holding that key or the first empty slot along its probe sequence.
+    """
+    def _probe(self, keys):
+        mask = np.uint64(len(self._table) - 1)
+        slots = (_mix(keys.view(np.uint64)) & mask).astype(np.int64)
+
+        pending = np.arange(len(keys))
+        while len(pending):
+            t = self._table[slots[pending]]
+            pending = pending[(t != keys[pending]) & (t != 0)]
+            slots[pending] = (slots[pending] + 1) & int(mask)
+
+        return slots
+
+    def contains(self, keys):
+        return self._table[self._probe(keys)] == keys
+
+    """
+    Inserts an array of distinct keys, none of which may already be in the index.
+    """
+    def insert(self, keys):
+        if len(self._table) < 2 * (self._size + len(keys)):
+            old = self._table[self._table != 0]
+            self._table = np.zeros(1 << (4 * (self._size + len(keys)) - 1).bit_length(), dtype=np.int64)
+            self._size = 0
+            self.insert(old)
+
+        pending = keys
+        while len(pending):  # keys contending for the same empty slot are retried until each claims its own
+            slots = self._probe(pending)
+            self._table[slots] = pending
+            pending = pending[self._table[slots] != pending]
+
+        self._size = self._size + len(keys)
+
+
+"""
+Probabilistic index of clause keys, as a scalable Bloom filter: a sequence of bit arrays, each twice the capacity of
+the previous one and with a tighter error rate, such that the overall false positive rate stays below error_rate
+regardless of the number of keys. A false positive rejects a clause which was never generated, which is acceptable
+for runs favouring memory (about 4 bytes per clause at the default error rate) over exact sampling.
+
+Parameters:
+  i.   capacity : number of keys held by the first bit array
+ ii. error_rate : upper bound on the probability of reporting a key which was never inserted
+"""
+class BloomIndex:
+    def __init__(self, capacity=1 << 16, error_rate=1e-6):
+        self.error_rate = error_rate
+        self._layers = []  # [bits, n_bits, n_hashes, capacity, size] per bit array
+        self._size = 0
+
+        self._add_layer(capacity)
+
+    def __len__(self):
+        return self._size
+
+    def _add_layer(self, capacity):
+        p = self.error_rate * math.pow(0.5, len(self._layers) + 1)
+        n_bits = math.ceil(-capacity * math.log(p) / (math.log(2) ** 2))
+        n_hashes = max(1, round(n_bits / capacity * math.log(2)))
+
+        self._layers.append([np.zeros((n_bits + 7) // 8, dtype=np.uint8), n_bits, n_hashes, capacity, 0])
+
+    """
+    Bit positions of every key in a bit array of n_bits bits, using double hashing.
+    """
+    @staticmethod
+    def _positions(keys, n_bits, n_hashes):
+        h = keys.view(np.uint64)
+        h1 = _mix(h)
+        h2 = _mix(h ^ np.uint64(0x9e3779b97f4a7c15)) | np.uint64(1)
+
+        j = np.arange(n_hashes, dtype=np.uint64)
+        return ((h1[:, None] + j * h2[:, None]) % np.uint64(n_bits)).astype(np.int64)
+
+    def contains(self, keys):
+        found = np.zeros(len(keys), dtype=bool)
+        for bits, n_bits, n_hashes, _, _ in self._layers:
+            pos = self._positions(keys, n_bits, n_hashes)
+            found |= ((bits[pos >> 3] >> (pos & 7).astype(np.uint8)) & 1).all(axis=1).astype(bool)
+
+        return found
+
+    def insert(self, keys):
+        while len(keys):
+            layer = self._layers[-1]
+            if layer[3] <= layer[4]:
+                self._add_layer(2 * layer[3])
+                continue
+
+            batch, keys = keys[:layer[3] - layer[4]], keys[layer[3] - layer[4]:]
+            pos = self._positions(batch, layer[1], layer[2]).ravel()
+            np.bitwise_or.at(layer[0], pos >> 3, np.left_shift(1, pos & 7).astype(np.uint8))
+
+            layer[4] = layer[4] + len(batch)
+            self._size = self._size + len(batch)
+
+
+"""
+Set of unique clauses with k literals each, stored as the rows of a contiguous int32 array (grown by doubling) with
+their literals sorted in ascending order, and indexed for uniqueness by a pluggable index of clause keys. Besides the
+batch interface used by generate_clauses, it supports `in` and add() for single clauses, such that it can be passed to
+add_clause in place of a set of frozensets.
+
+Parameters:
+  i. n_vars : number of variables in instance
+ ii.      k : the number of literals in each clause
+iii.  index : the uniqueness index; either "hash" (exact), "bloom" (probabilistic) or an index object
+"""
+class ClauseSet:
+    def __init__(self, n_vars, k, index="hash"):
+        self.n_vars = n_vars
+        self.k = k
+
+        if index == "hash":
+            self.index = HashIndex()
+        elif index == "bloom":
+            self.index = BloomIndex()
+        else:
+            self.index = index
+
+        self._clauses = np.empty((1024, k), dtype=np.int32)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        return iter(self.clauses)
+
+    def __contains__(self, clause):
+        return bool(self.contains(self.keys(self._row(clause)))[0])
+
+    """
+    View of the (m, k) array of clauses added so far.
+    """
+    @property
+    def clauses(self):
+        return self._clauses[:self._size]
+
+    def _row(self, clause):
+        return np.sort(np.fromiter(clause, dtype=np.int32, count=self.k))[None, :]
+
+    """
+    Keys of an (m, k) array of clauses, whose rows must already be sorted.
+    """
+    def keys(self, clauses):
+        return clause_keys(clauses, self.n_vars)
+
+    def contains(self, keys):
+        return self.index.contains(keys)
+
+    """
+    Appends an (m, k) array of sorted clauses, along with their (distinct and not yet indexed) keys.
+    """
+    def extend(self, clauses, keys):
+        if len(self._clauses) < self._size + len(clauses):
+            grown = np.empty((max(2 * len(self._clauses), self._size + len(clauses)), self.k), dtype=np.int32)
+            grown[:self._size] = self.clauses
+            self._clauses = grown
+
+        self._clauses[self._size:self._size + len(clauses)] = clauses
+        self._size = self._size + len(clauses)
+        self.index.insert(keys)
+
+    def add(self, clause):
+        row = self._row(clause)
+        self.extend(row, self.keys(row))
@@ -1,32 +1,113 @@
+import numpy as np
+
+from core.ClauseIndex import ClauseSet
+
+import os
+import math
 import random
+import shutil
 import datetime
+import itertools
+
+"""
+Maximum number of clauses a variable can appear in without breaking the ALLL conditions, for clauses with k literals.
+"""
+def max_var_clauses(k):
+    return math.floor(math.pow(2, k) / (k * math.e))
+
+
+"""
+Indexed pool of the variables available to form part of a clause. Variables are held in the first `size` entries of an
+int32 array, together with an index holding the position of each variable in that array (or -1 once removed), such
+that a variable is removed by swapping it with the last available variable. This supports removal and membership tests
+in O(1) time and sampling k variables in O(k) time, using 8 bytes per variable.
+
+Parameters:
+  i. n_vars : number of variables in instance (the pool initially holds variables 1 to n_vars)
+"""
+class VarPool:
+    def __init__(self, n_vars):
+        self._vars = np.arange(1, n_vars + 1, dtype=np.int32)
+        self._pos = np.arange(n_vars, dtype=np.int32)
+        self._size = n_vars
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, v):
+        return 0 < v <= len(self._pos) and 0 <= self._pos[v - 1]
+
+    """
+    View of the variables currently in the pool (in no particular order).
+    """
+    def active(self):
+        return self._vars[:self._size]
+
+    def remove(self, v):
+        i = self._pos[v - 1]
+        last = self._vars[self._size - 1]
+
+        self._vars[i] = last  # move the last available variable into the slot of the removed one
+        self._pos[last - 1] = i
+        self._pos[v - 1] = -1
+        self._size = self._size - 1
+
+    """
+    Removes an array of distinct variables from the pool in O(len(vs)) time; the slots of removed variables below the
+    new size of the pool are filled with the variables remaining in the slots above it.
+    """
+    def remove_many(self, vs):
+        size = self._size - len(vs)
+
+        holes = self._pos[vs - 1]
+        holes = holes[holes < size]
+        self._pos[vs - 1] = -1
+
+        tail = self._vars[size:self._size]
+        tail = tail[0 <= self._pos[tail - 1]]
+
+        self._vars[holes] = tail
+        self._pos[tail - 1] = holes
+        self._size = size
+
+    def sample(self, k, rng=random):
+        return self._vars[rng.sample(range(self._size), k)].tolist()
+
+    """
+    Draws an (n_rows, k) array of variables from the pool, with the variables of each row being distinct.
+    """
+    def sample_rows(self, rng, k, n_rows):
+        return self._vars[_sample_distinct(rng, self._size, k, n_rows)]
+
 
 """
 Responsible for the generation of a random clause and updating any state variables related to the ALLL constraints
 
 Parameters:
-  i.            vars : list of available variables that can form part of a clause
+  i.            vars : pool (VarPool) of available variables that can form part of a clause
  ii.      var_counts : list of the number of clauses in which each variable appears
 iii.               k : the required number of literals in the clause
  iv. max_var_clauses : the maximum number of clauses in which a variable can appear to satisfy the ALLL conditions
   v.            bias : parameter controlling the 'degree' by which the ALLL conditions are not satisfied
- vi.     clauses_arr : array of currently generated random clauses (to check if new clause is unique)
+ vi.     clauses_arr : set (or ClauseSet) of currently generated random clauses (to check if new clause is unique)
 vii.        max_trys : maximum number of trys to generate a unique clause (if collisions occur with clauses in clauses_arr)
+viii.            rng : optional random.Random instance from which the clause is drawn (the random module by default),
+                      such that instances generated from a seeded random.Random are reproducible
 """
-def add_clause(vars, var_counts, k, max_var_clauses, bias, clauses_arr, max_trys):
+def add_clause(vars, var_counts, k, max_var_clauses, bias, clauses_arr, max_trys, rng=random):
     unique = False  # flag to signal unique clause
     failed = False  # flag to signal if maximum number of trys to generate a unique clause has been reached
     count = 0  # count of number of trys to generate a unique clause
 
     while not unique and not failed:  # until a valid clauses is generated and max_trys not reached...
         count = count + 1
-        clauses_vars = random.sample(vars, k)  # randomly select k variables
-        clauses_signs = random.choices([-1, 1], k=k)  # generate signs for each variable (ie. either var or its negation)
+        clauses_vars = vars.sample(k, rng)  # randomly select k variables
+        clauses_signs = rng.choices([-1, 1], k=k)  # generate signs for each variable (ie. either var or its negation)
         clause = frozenset([x * y for x, y in zip(clauses_vars, clauses_signs)])  # apply signs to the selected vars
 
         unique = True
-        if clause in clauses_arr:  # carried in O(1) time since clause is a hashable type and clauses_arr is a set acting
-                                   # as a hash table
+        if clause in clauses_arr:  # carried in O(1) time since clause is a hashable type and clauses_arr is a set (or a
+                                   # ClauseSet) acting as a hash table
             unique = False
             if max_trys <= count:
                 failed = True
@@ -38,40 +119,328 @@ def add_clause(vars, var_counts, k, max_var_clauses, bias, clauses_arr, max_trys
             var_counts[v-1] = var_counts[v-1] + 1  # update the count of the number of clauses in which it appears
 
             # if ALLL conditions are broken above max_var_clauses and a random nuber is generated below the bias...
-            if max_var_clauses < var_counts[v-1] and random.random() < bias:
-                vars.remove(v)  # remove variables from the vars array (ie. var can no longer form part of future
+            if max_var_clauses < var_counts[v-1] and rng.random() < bias:
+                vars.remove(v)  # remove variables from the vars pool (ie. var can no longer form part of future
                                 # generated random clauses)
 
         return clause, vars, var_counts, False
 
 
 """
-Simple utility function responsible for representing a list of clauses as a DIMACS CNF file.
+Draws `n_rows` rows of `k` distinct indices in the range [0, n_pool), uniformly at random. For pools which are large
+relative to k, rows are drawn with replacement and only the rows containing a repeated index are redrawn; small pools
+fall back to taking the first k entries of a random permutation of the pool per row.
+"""
+def _sample_distinct(rng, n_pool, k, n_rows):
+    if n_pool <= 4 * k:
+        return np.argsort(rng.random((n_rows, n_pool)), axis=1)[:, :k]
+
+    idx = rng.integers(0, n_pool, size=(n_rows, k))
+    while True:
+        s = np.sort(idx, axis=1)
+        repeated = (s[:, 1:] == s[:, :-1]).any(axis=1)
+        if not repeated.any():
+            return idx
+
+        idx[repeated] = rng.integers(0, n_pool, size=(np.count_nonzero(repeated), k))
+
+
+"""
+Variable-to-clause incidence index of an instance in compressed sparse row (CSR) form: the clauses in which variable v
+(numbered from 0) appears are indices[indptr[v]:indptr[v + 1]], in increasing order.
+
+Parameters:
+  i. var_idx : (m, k) array of the variables (numbered from 0) of every clause
+ ii.  n_vars : number of variables in instance
+"""
+class IncidenceIndex:
+    def __init__(self, var_idx, n_vars):
+        flat = var_idx.ravel()
+        order = np.argsort(flat, kind="stable")
+
+        self.indices = (order // max(var_idx.shape[1], 1)).astype(np.int64)
+        self.indptr = np.zeros(n_vars + 1, dtype=np.int64)
+        np.cumsum(np.bincount(flat, minlength=n_vars), out=self.indptr[1:])
+
+    """
+    Returns the (sorted, unique) indices of every clause in which any of the given variables appears.
+    """
+    def clauses_of(self, vars):
+        starts = self.indptr[vars]
+        counts = self.indptr[vars + 1] - starts
+        ends = np.cumsum(counts)
+
+        # gather the rows of all variables at once, as the positions starts[i], ..., starts[i] + counts[i] - 1
+        positions = np.arange(ends[-1] if len(ends) else 0) + np.repeat(starts - ends + counts, counts)
+
+        return np.unique(self.indices[positions])
+
+
+"""
+Vectorised counterpart of add_clause, responsible for generating a complete random instance in batches of clauses
+rather than one clause at a time. Each batch draws candidate clauses from the currently available variables as an
+(batch_size, k) int32 array, applies signs, rejects duplicate clauses and updates the per-variable clause counts and the
+bias-based pruning of variables using array operations.
+
+The statistical semantics of add_clause are kept: once a variable appears in more than max_var_clauses clauses, every
+further clause containing it prunes it with probability bias, and generation stops once fewer than k + 1 variables
+are available or max_trys consecutive candidate clauses are rejected as duplicates. A batch is cut at the first clause
+containing a variable pruned by an earlier clause of the same batch, or drawn once the variables pruned by earlier
+clauses of the batch leave no more than k variables available (at which add_clause would have stopped), and the
+remainder is redrawn from the updated variables (ie. equivalent to rejection sampling from the variables available at
+the time each clause is added).
 
 Parameters:
-  i.      clauses_arr : array of generated random clauses
+  i.          n_vars : number of variables in instance
+ ii.               k : the required number of literals in each clause
+iii. max_var_clauses : the maximum number of clauses in which a variable can appear to satisfy the ALLL conditions
+ iv.            bias : parameter controlling the 'degree' by which the ALLL conditions are not satisfied
+  v.        max_trys : maximum number of consecutive trys to generate a unique clause
+ vi.      batch_size : optional maximum number of candidate clauses drawn per batch
+vii.           index : uniqueness index of the generated clauses (see ClauseSet); either "hash" or "bloom"
+viii.           seed : optional seed of the instance, from which the same instance is always generated for the same
+                      parameters (drawn from random by default)
+
+Returns the (m, k) int32 array of clauses, the array of the number of clauses in which each variable appears, and the
+total number of candidate clauses rejected as duplicates.
+"""
+def generate_clauses(n_vars, k, max_var_clauses, bias, max_trys, batch_size=None, index="hash", seed=None):
+    if seed is None:  # seeded from random, so that random.seed() applies here too
+        seed = random.getrandbits(64)
+
+    rng = np.random.default_rng(seed)
+
+    vars = VarPool(n_vars)  # variables currently available to form part of a clause
+    var_counts = np.zeros(n_vars, dtype=np.int64)
+    clauses_arr = ClauseSet(n_vars, k, index)  # clauses generated so far, stored contiguously and indexed by key
+
+    n_collisions = 0
+    run = 0  # number of consecutive rejected candidates at the end of the previous batch
+    n_rows = 64
+
+    while k < len(vars):
+        n_rows = min(n_rows, batch_size if batch_size else 65536)
+
+        clauses_vars = vars.sample_rows(rng, k, n_rows)
+        clauses = clauses_vars * (2 * rng.integers(0, 2, size=(n_rows, k), dtype=np.int32) - 1)
+        clauses.sort(axis=1)
+        keys = clauses_arr.keys(clauses)
+
+        # reject candidates repeated within the batch (keeping the first occurrence) or generated in a previous batch
+        _, first = np.unique(keys, return_index=True)
+        accept = np.zeros(n_rows, dtype=bool)
+        accept[first] = ~clauses_arr.contains(keys[first])
+
+        # for every occurrence of a variable above max_var_clauses, the variable is pruned with probability bias; find
+        # the row at which each variable is pruned (if any) by ranking its occurrences in the accepted candidates
+        rows = np.repeat(np.nonzero(accept)[0], k)
+        occ = clauses_vars[accept].ravel()
+        order = np.argsort(occ, kind="stable")
+        occ, rows = occ[order], rows[order]
+        starts = np.flatnonzero(np.r_[True, occ[1:] != occ[:-1]])
+        rank = np.arange(len(occ)) - np.repeat(starts, np.diff(np.r_[starts, len(occ)]))
+
+        prune = (max_var_clauses < var_counts[occ - 1] + rank + 1) & (rng.random(len(occ)) < bias)
+        prune_row = np.full(len(occ), n_rows)
+        cut = n_rows
+        if len(occ):
+            group_prune_row = np.minimum.reduceat(np.where(prune, rows, n_rows), starts)
+            prune_row = np.repeat(group_prune_row, np.diff(np.r_[starts, len(occ)]))
+
+            # cut the batch at the first candidate (accepted or not) containing a variable pruned by an earlier one
+            group = np.clip(np.searchsorted(occ[starts], clauses_vars), 0, len(starts) - 1)
+            late = (occ[starts][group] == clauses_vars) & (group_prune_row[group] < np.arange(n_rows)[:, None])
+            cut = np.argmax(late.any(axis=1)) if late.any() else n_rows
+
+            # and at the first candidate drawn once the variables pruned by earlier ones leave no more than k available
+            n_pruned = np.searchsorted(np.sort(group_prune_row), np.arange(n_rows))
+            exhausted = len(vars) - n_pruned <= k
+            if exhausted.any():
+                cut = min(cut, np.argmax(exhausted))
+
+        accept[cut:] = False
+
+        # length of the run of consecutive rejections ending at each candidate, carried over from the previous batch
+        idx = np.arange(cut)
+        runs = idx - np.maximum.accumulate(np.where(accept[:cut], idx, -1 - run))
+
+        failed = 0 < cut and max_trys <= runs.max()
+        if failed:  # discard every candidate from the one at which max_trys was reached
+            cut = np.argmax(max_trys <= runs)
+            accept[cut:] = False
+        elif 0 < cut:
+            run = runs[-1]
+
+        n_collisions = n_collisions + cut - np.count_nonzero(accept)
+        clauses_arr.extend(clauses[accept], keys[accept])
+
+        # update the count of the number of clauses in which each variable appears, and prune...
+        kept = rows < cut
+        v, c = np.unique(occ[kept], return_counts=True)
+        var_counts[v - 1] = var_counts[v - 1] + c
+
+        pruned = np.unique(occ[kept & (prune_row < cut)])
+        if len(pruned):
+            vars.remove_many(pruned)
+
+        if failed:
+            break
+
+        n_rows = 2 * n_rows if cut == n_rows else max(16, 2 * cut)  # adapt the batch size to the cut observed
+
+    return clauses_arr.clauses, var_counts, n_collisions
+
+
+"""
+Formats a chunk of clauses as the lines of a DIMACS CNF file. An (m, k) array of clauses is formatted by a single
+%-format over the whole chunk; any other list of clauses falls back to formatting each clause in turn.
+"""
+def _format_clauses(chunk):
+    if isinstance(chunk, np.ndarray):
+        return (("%d " * chunk.shape[1] + "0\n") * len(chunk)) % tuple(chunk.ravel().tolist())
+
+    return "".join(" ".join(map(str, c)) + " 0\n" for c in chunk)
+
+
+"""
+Opens a file for binary writing, optionally compressed. The file is written through a large buffer, to issue few
+large writes rather than one write per clause.
+
+Parameters:
+  i.        path : path of the file, without any compression extension
+ ii. compression : one of None, "gzip", "xz" or "zstd" (the latter requiring the zstandard package)
+
+Returns the opened file along with its full path.
+"""
+def _open_output(path, compression=None):
+    if compression is None:
+        return open(path, "wb", buffering=1 << 20), path
+    elif compression == "gzip":
+        import gzip
+        return gzip.open(path + ".gz", "wb", compresslevel=6), path + ".gz"
+    elif compression == "xz":
+        import lzma
+        return lzma.open(path + ".xz", "wb"), path + ".xz"
+    elif compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("zstd compression requires the zstandard package")
+
+        return zstandard.ZstdCompressor().stream_writer(open(path + ".zst", "wb", buffering=1 << 20)), path + ".zst"
+    else:
+        raise ValueError("Unknown compression: " + str(compression))
+
+
+def _count_clauses(clauses_arr, n_clauses):
+    if n_clauses is None:
+        if not hasattr(clauses_arr, "__len__"):
+            raise ValueError("n_clauses is required when writing clauses from an iterator")
+
+        n_clauses = len(clauses_arr)
+
+    return n_clauses
+
+
+"""
+Streams a list of clauses in DIMACS CNF format to a file opened for binary writing, formatting and writing the clauses
+in chunks such that the instance is never held in memory as a single string.
+
+Parameters:
+  i.        cnf_file : file (or pipe) opened for binary writing
+ ii.     clauses_arr : (m, k) array of clauses, or any iterable of clauses
+iii.          n_vars : number of variables in instance
+ iv.        gen_time : time at which the instance was generated
+  v.       n_clauses : number of clauses; required only if clauses_arr has no len()
+ vi.      chunk_size : number of clauses formatted per write
+"""
+def write_dimacs(cnf_file, clauses_arr, n_vars, gen_time, n_clauses=None, chunk_size=65536):
+    n_clauses = _count_clauses(clauses_arr, n_clauses)
+
+    s = "c RandomSATGen Instance\nc Generated on " + gen_time.strftime("%d/%m/%Y, %H:%M:%S") + "\np cnf " \
+        + str(n_vars) + " " + str(n_clauses) + "\n"
+    cnf_file.write(s.encode())
+
+    if isinstance(clauses_arr, ClauseSet):
+        clauses_arr = clauses_arr.clauses
+
+    if isinstance(clauses_arr, np.ndarray):
+        for i in range(0, len(clauses_arr), chunk_size):
+            cnf_file.write(_format_clauses(clauses_arr[i:i + chunk_size]).encode())
+    else:
+        it = iter(clauses_arr)
+        while True:
+            chunk = list(itertools.islice(it, chunk_size))
+            if not chunk:
+                break
+
+            cnf_file.write(_format_clauses(chunk).encode())
+
+
+"""
+Simple utility function responsible for representing a list of clauses as a DIMACS CNF file. The file is streamed to
+disk through write_dimacs and closed (and optionally synced to disk) before returning, such that it is complete by the
+time any solver is run on it.
+
+Parameters:
+  i.      clauses_arr : (m, k) array of generated random clauses, or any iterable of clauses
  ii.           n_vars : number of variables in instance
 iii.              dir : directory at which to persist file
  iv. file_name_suffix : argument providing suffix to name of file persisted to disk
+  v.      compression : optional compression of the file; one of "gzip", "xz" or "zstd"
+ vi.        n_clauses : number of clauses; required only if clauses_arr has no len()
+vii.            fsync : whether to sync the file to disk before returning
+viii.        gen_time : time at which the instance was generated, from which the file is named (now by default)
 """
-def to_dimacs_cnf(clauses_arr, n_vars, dir, file_name_suffix):
-    gen_time = datetime.datetime.now()
+def to_dimacs_cnf(clauses_arr, n_vars, dir, file_name_suffix, compression=None, n_clauses=None, fsync=False,
+                  gen_time=None):
+    if gen_time is None:
+        gen_time = datetime.datetime.now()
     cnf_file_name = dir + "rand_cnf_" + gen_time.strftime("%d_%m_%Y_%H_%M_%S") + file_name_suffix
-    cnf_file = open(cnf_file_name + ".cnf", 'a')
 
-    s = "c RandomSATGen Instance\nc Generated on " + gen_time.strftime("%d/%m/%Y, %H:%M:%S") + "\np cnf " \
-        + str(n_vars) + " " + str(len(clauses_arr)) + "\n"
-    cnf_file.write(s)
+    n_clauses = _count_clauses(clauses_arr, n_clauses)
 
-    for c in clauses_arr:
-        s = ""
+    cnf_file, path = _open_output(cnf_file_name + ".cnf", compression)
+    with cnf_file:
+        write_dimacs(cnf_file, clauses_arr, n_vars, gen_time, n_clauses)
 
-        for l in c:
-            s = s + str(l) + " "
+    if fsync:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
 
-        s = s + "0\n"
-        cnf_file.write(s)
+    return cnf_file_name
 
-    cnf_file.close()
 
-    return cnf_file_name
+"""
+Compresses a file on disk by streaming it through the compressor, removing the uncompressed file once done.
+
+Parameters:
+  i.        path : path of the file to compress
+ ii. compression : one of "gzip", "xz" or "zstd"
+
+Returns the path of the compressed file.
+"""
+def compress_file(path, compression):
+    out_file, out_path = _open_output(path, compression)
+    with out_file, open(path, "rb") as in_file:
+        shutil.copyfileobj(in_file, out_file, 1 << 20)
+
+    os.remove(path)
+
+    return out_path
+
+
+"""
+Reads the statistics persisted by the solver alongside a DIMACS CNF file, as a structured array with fields:
+[0] t_read, [1] n, [2] m, [3] l, [4] t_solve, [5] n_threads, [6] n_iterations
+
+Parameters:
+  i. cnf_file_name : name of the CNF file (without extension) whose statistics are read
+"""
+def read_stats(cnf_file_name):
+    stats = np.genfromtxt(cnf_file_name + ".csv", delimiter=",", dtype=[float, int, int, int, float, int, int])
+
+    return np.atleast_1d(stats)
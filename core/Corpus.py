@@ -0,0 +1,271 @@
+import numpy as np
+
+from core.CoreUtils import to_dimacs_cnf, read_stats
+
+import os
+import datetime
+
+MAGIC = b"RSATCNF1"
+
+"""
+Header of a binary instance file, followed directly by the (m, k) int32 clause matrix in C order. The header is padded
+to HEADER_SIZE bytes, such that the clauses are aligned and can be mapped by np.memmap at a fixed offset. Fields which
+are unknown (eg. the seed of an instance converted from DIMACS) hold -1 (NaN for floating point fields), and the solve
+statistics are those of the solver's csv file: t_read, n, m, l, t_solve, n_threads, n_iterations.
+"""
+HEADER_DTYPE = np.dtype([("magic", "S8"), ("n_vars", "<i8"), ("k", "<i8"), ("m", "<i8"), ("bias", "<f8"),
+                         ("seed", "<i8"), ("gen_time", "<f8"), ("solved", "<i8"), ("t_read", "<f8"), ("n", "<i8"),
+                         ("n_clauses", "<i8"), ("l", "<i8"), ("t_solve", "<f8"), ("n_threads", "<i8"),
+                         ("n_iterations", "<i8")])
+HEADER_SIZE = 128
+
+STATS_FIELDS = ["t_read", "n", "n_clauses", "l", "t_solve", "n_threads", "n_iterations"]
+
+"""
+Record of the corpus index: the header of an instance along with the name of its file (relative to the corpus).
+"""
+INDEX_DTYPE = np.dtype(HEADER_DTYPE.descr + [("name", "S96")])
+INDEX_FILE = "corpus.idx"
+
+"""
+Responsible for persisting an instance in the binary instance format.
+
+Parameters:
+  i.     path : path of the file
+ ii.  clauses : (m, k) array of clauses
+iii.   n_vars : number of variables in instance
+ iv.     bias : the bias with which the instance was generated (unknown by default)
+  v.     seed : the seed from which the instance was generated (unknown by default)
+ vi. gen_time : time at which the instance was generated (now by default)
+vii.    stats : optional statistics of a solver run on the instance (see read_stats)
+
+Returns the header of the instance.
+"""
+def write_instance(path, clauses, n_vars, bias=np.nan, seed=-1, gen_time=None, stats=None):
+    clauses = np.ascontiguousarray(clauses, dtype=np.int32)
+    if gen_time is None:
+        gen_time = datetime.datetime.now()
+
+    header = np.zeros(1, dtype=HEADER_DTYPE)
+    header[0] = (MAGIC, n_vars, clauses.shape[1], clauses.shape[0], bias, seed, gen_time.timestamp(), 0,
+                 np.nan, -1, -1, -1, np.nan, -1, -1)
+    if stats is not None:
+        header["solved"] = 1
+        for i, field in enumerate(STATS_FIELDS):
+            header[field] = stats[0][i]
+
+    with open(path, "wb", buffering=1 << 20) as f:
+        f.write(header.tobytes().ljust(HEADER_SIZE, b"\0"))
+        f.write(clauses.tobytes())
+
+    return header[0]
+
+
+"""
+Reads the header of an instance in the binary instance format.
+"""
+def read_header(path):
+    with open(path, "rb") as f:
+        header = np.frombuffer(f.read(HEADER_DTYPE.itemsize), dtype=HEADER_DTYPE)
+
+    if len(header) == 0 or header[0]["magic"] != MAGIC:
+        raise ValueError(path + " is not a binary instance file")
+
+    return header[0]
+
+
+"""
+Reads an instance in the binary instance format, returning its header along with its clauses as a read-only (m, k)
+memory-mapped array, such that the clauses are only read from disk as accessed and never copied.
+"""
+def read_instance(path):
+    header = read_header(path)
+    if header["m"] == 0:
+        return header, np.zeros((0, header["k"]), dtype=np.int32)
+
+    clauses = np.memmap(path, dtype=np.int32, mode="r", offset=HEADER_SIZE, shape=(header["m"], header["k"]))
+
+    return header, clauses
+
+
+def _open_input(path):
+    if path.endswith(".gz"):
+        import gzip
+        return gzip.open(path, "rb")
+    elif path.endswith(".xz"):
+        import lzma
+        return lzma.open(path, "rb")
+    elif path.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("zstd compression requires the zstandard package")
+
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"))
+
+    return open(path, "rb")
+
+
+"""
+Reads a DIMACS CNF file (optionally compressed, as written by to_dimacs_cnf) with the same number of literals in every
+clause, returning the number of variables, the (m, k) int32 array of clauses and the time at which the instance was
+generated (None unless given in the comments, as written by write_dimacs).
+"""
+def read_dimacs(path):
+    with _open_input(path) as f:
+        data = f.read()
+
+    n_vars, n_clauses, gen_time, start = None, None, None, 0
+    while start < len(data) and n_vars is None:  # skip comments up to the problem line
+        end = data.find(b"\n", start)
+        end = len(data) if end < 0 else end
+        line = data[start:end]
+        if line.startswith(b"c Generated on "):
+            gen_time = datetime.datetime.strptime(line[15:].decode().strip(), "%d/%m/%Y, %H:%M:%S")
+        elif line.startswith(b"p"):
+            n_vars, n_clauses = int(line.split()[2]), int(line.split()[3])
+        start = end + 1
+
+    if n_vars is None:
+        raise ValueError(path + " has no DIMACS problem line")
+
+    lits = np.fromstring(data[start:].decode(), dtype=np.int64, sep=" ")
+    if n_clauses == 0:
+        return n_vars, np.zeros((0, 0), dtype=np.int32), gen_time
+
+    k = int(np.argmax(lits == 0))
+    if len(lits) != n_clauses * (k + 1) or np.any(lits.reshape(n_clauses, k + 1)[:, k] != 0):
+        raise ValueError(path + " does not hold " + str(n_clauses) + " clauses of " + str(k) + " literals")
+
+    return n_vars, lits.reshape(n_clauses, k + 1)[:, :k].astype(np.int32), gen_time
+
+
+"""
+Converts a DIMACS CNF file to the binary instance format, along with the statistics of a solver run on it if present
+next to it (see read_stats), and the time at which it was generated (or last modified, if not given in the file).
+
+Parameters:
+  i. cnf_path : path of the DIMACS CNF file (optionally compressed)
+ ii.     path : path of the binary instance file
+iii.     bias : the bias with which the instance was generated (unknown by default)
+ iv.     seed : the seed from which the instance was generated (unknown by default)
+
+Returns the header of the instance.
+"""
+def dimacs_to_instance(cnf_path, path, bias=np.nan, seed=-1):
+    n_vars, clauses, gen_time = read_dimacs(cnf_path)
+
+    stats = None
+    stem = cnf_path[:cnf_path.rindex(".cnf")]
+    if os.path.exists(stem + ".csv"):
+        stats = read_stats(stem)
+
+    if gen_time is None:
+        gen_time = datetime.datetime.fromtimestamp(os.path.getmtime(cnf_path))
+
+    return write_instance(path, clauses, n_vars, bias, seed, gen_time, stats)
+
+
+"""
+Converts an instance in the binary instance format to a DIMACS CNF file, in the layout of to_dimacs_cnf (and named
+after the time at which the instance was generated), returning the name of the CNF file (without extension).
+
+Parameters:
+  i.             path : path of the binary instance file
+ ii.              dir : directory at which to persist the CNF file
+iii. file_name_suffix : optional suffix to name of the CNF file
+ iv.      compression : optional compression of the file; one of "gzip", "xz" or "zstd"
+"""
+def instance_to_dimacs(path, dir, file_name_suffix="", compression=None):
+    header, clauses = read_instance(path)
+
+    return to_dimacs_cnf(clauses, int(header["n_vars"]), dir, file_name_suffix, compression,
+                         gen_time=datetime.datetime.fromtimestamp(header["gen_time"]))
+
+
+def _record(name, header):
+    record = np.zeros(1, dtype=INDEX_DTYPE)
+    for field in HEADER_DTYPE.names:
+        record[field] = header[field]
+    record["name"] = os.path.basename(name).encode()
+
+    return record.tobytes()
+
+
+"""
+Index of a corpus of instances in the binary instance format held in a single directory, as a file of fixed-size
+records (one per instance, see INDEX_DTYPE) to which instances are appended as they are added. The index is mapped by
+np.memmap, such that queries over large corpora are answered with array operations over the headers alone, without
+opening any instance file.
+
+Parameters:
+  i. dir : directory of the corpus
+"""
+class CorpusIndex:
+    def __init__(self, dir):
+        self.dir = dir
+        self.path = os.path.join(dir, INDEX_FILE)
+
+    """
+    Records of every instance in the corpus.
+    """
+    @property
+    def entries(self):
+        if not os.path.exists(self.path) or os.path.getsize(self.path) < INDEX_DTYPE.itemsize:
+            return np.zeros(0, dtype=INDEX_DTYPE)
+
+        return np.memmap(self.path, dtype=INDEX_DTYPE, mode="r",
+                         shape=(os.path.getsize(self.path) // INDEX_DTYPE.itemsize,))
+
+    def __len__(self):
+        return len(self.entries)
+
+    """
+    Appends an instance of the corpus to the index, given its file name and header.
+    """
+    def add(self, name, header):
+        with open(self.path, "ab") as f:
+            f.write(_record(name, header))
+
+    """
+    Writes an instance to the corpus in the binary instance format and adds it to the index (see write_instance).
+    """
+    def write(self, name, clauses, n_vars, bias=np.nan, seed=-1, gen_time=None, stats=None):
+        header = write_instance(os.path.join(self.dir, name), clauses, n_vars, bias, seed, gen_time, stats)
+        self.add(name, header)
+
+        return header
+
+    """
+    Rebuilds the index from the headers of every binary instance file in the corpus.
+    """
+    def rebuild(self):
+        records = []
+        for entry in sorted(os.scandir(self.dir), key=lambda e: e.name):
+            if entry.name.endswith(".rsat"):
+                records.append((entry.name, read_header(entry.path)))
+
+        with open(self.path, "wb") as f:
+            for name, header in records:
+                f.write(_record(name, header))
+
+    """
+    Returns the paths of the instances matching every given condition, where each condition is either the exact
+    value of a header field (eg. k=5) or a bound on it, given by the field name suffixed with _min or _max (eg.
+    m_min=1000 for all instances with at least 1000 clauses).
+    """
+    def query(self, **conditions):
+        entries = self.entries
+        mask = np.ones(len(entries), dtype=bool)
+
+        for condition, value in conditions.items():
+            if condition.endswith("_min") and condition[:-4] in HEADER_DTYPE.names:
+                mask &= value <= entries[condition[:-4]]
+            elif condition.endswith("_max") and condition[:-4] in HEADER_DTYPE.names:
+                mask &= entries[condition[:-4]] <= value
+            elif condition in HEADER_DTYPE.names:
+                mask &= entries[condition] == value
+            else:
+                raise ValueError("Unknown field: " + condition)
+
+        return [os.path.join(self.dir, name.decode()) for name in entries["name"][mask]]
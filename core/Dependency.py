@@ -0,0 +1,94 @@
+import numpy as np
+
+from core.CoreUtils import max_var_clauses
+
+import itertools
+
+"""
+Fields of the summary of an instance's dependency structure (see analyse), in the order in which they are recorded.
+"""
+FIELDS = ["d_max", "d_mean", "d_p50", "d_p90", "d_p99", "delta", "delta_mean", "v_max", "v_over"]
+
+"""
+Computes the dependency degree of every clause of an instance, ie. the number of other clauses sharing at least one
+variable with it (its degree in the dependency graph of the Lovasz Local Lemma). By inclusion-exclusion over the sets
+of clauses in which each of its variables appears, the degree of a clause is
+
+    d = sum (c_S - 1) over S of size 1 - sum (c_S - 1) over S of size 2 + sum (c_S - 1) over S of size 3 - ...
+
+where S ranges over the subsets of the clause's variables and c_S is the number of clauses containing all of S. Only
+the counts of single variables and of pairs are computed over the whole instance (as array operations over the
+variable counts and the integer keys of all pairs); larger subsets can only be shared by clauses already sharing a
+pair, which are few, such that higher order terms are only computed for these.
+
+Parameters:
+  i. clauses : (m, k) array of clauses, as generated by generate_clauses
+ ii.  n_vars : number of variables in instance
+
+Returns the array of the dependency degree of every clause.
+"""
+def dependency_degrees(clauses, n_vars):
+    var_idx = np.sort(np.abs(np.asarray(clauses)).astype(np.int64) - 1, axis=1)
+    m, k = var_idx.shape
+
+    var_counts = np.bincount(var_idx.ravel(), minlength=n_vars)
+    degrees = (var_counts[var_idx] - 1).sum(axis=1)
+    if k < 2 or m == 0:
+        return degrees
+
+    # pairs of variables, keyed by a single integer, and the number of clauses containing each
+    cols = np.array(list(itertools.combinations(range(k), 2)))
+    keys = var_idx[:, cols[:, 0]] * n_vars + var_idx[:, cols[:, 1]]
+    _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    excess = counts[inverse.reshape(keys.shape)] - 1
+    degrees = degrees - excess.sum(axis=1)
+
+    # subsets of 3 or more variables, over the clauses sharing a subset one smaller
+    shared = np.flatnonzero(excess.any(axis=1))
+    for r in range(3, k + 1):
+        if len(shared) == 0:
+            break
+
+        cols = np.array(list(itertools.combinations(range(k), r)))
+        subsets = var_idx[shared][:, cols]  # (clauses, subsets, r)
+        _, inverse, counts = np.unique(subsets.reshape(-1, r), axis=0, return_inverse=True, return_counts=True)
+        excess = counts[inverse.reshape(subsets.shape[:2])] - 1
+
+        degrees[shared] = degrees[shared] + (-1) ** (r + 1) * excess.sum(axis=1)
+        shared = shared[excess.any(axis=1)]
+
+    return degrees
+
+
+"""
+Summarises how far an instance is from the conditions of the Lovasz Local Lemma: the maximum, mean and percentiles of
+the dependency degrees d of its clauses (see dependency_degrees), along with the effective violation
+
+    delta = e (d + 1) / 2^k - 1
+
+of the symmetric condition e p (d + 1) <= 1 (with p = 2^-k the probability of a clause being violated), for the
+maximum (delta) and mean (delta_mean) dependency degree; the condition holds when delta <= 0. The variable counts
+tracked by the generator are summarised too: the maximum number of clauses in which a variable appears (v_max) and the
+fraction of variables appearing in more than max_var_clauses(k) clauses (v_over).
+
+Parameters:
+  i. clauses : (m, k) array of clauses, as generated by generate_clauses
+ ii.  n_vars : number of variables in instance
+
+Returns a dict holding every field of FIELDS.
+"""
+def analyse(clauses, n_vars):
+    clauses = np.asarray(clauses)
+    if len(clauses) == 0:
+        return dict.fromkeys(FIELDS, 0.0)
+
+    k = clauses.shape[1]
+    degrees = dependency_degrees(clauses, n_vars)
+    var_counts = np.bincount(np.abs(clauses).ravel() - 1, minlength=n_vars)
+
+    d_max, d_mean = int(degrees.max()), float(degrees.mean())
+    d_p50, d_p90, d_p99 = np.percentile(degrees, [50, 90, 99])
+
+    return {"d_max": d_max, "d_mean": d_mean, "d_p50": float(d_p50), "d_p90": float(d_p90), "d_p99": float(d_p99),
+            "delta": float(np.e * (d_max + 1) / 2**k - 1), "delta_mean": float(np.e * (d_mean + 1) / 2**k - 1),
+            "v_max": int(var_counts.max()), "v_over": float(np.mean(max_var_clauses(k) < var_counts))}
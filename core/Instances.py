@@ -0,0 +1,130 @@
+import numpy as np
+
+from core.CoreUtils import generate_clauses, max_var_clauses
+
+import os
+import time
+import secrets
+import tempfile
+
+"""
+Fresh master seed, drawn from the entropy of the operating system.
+"""
+def new_master_seed():
+    return secrets.randbits(63)
+
+
+"""
+Seed of a single instance, derived from a master seed and the parameters of the instance: the number of variables n,
+the number of literals k, the bias b and the repetition rep (ie. the index of the instance among those with the same
+parameters). Every instance of a run is thus reproducible from the master seed alone.
+"""
+def instance_seed(master_seed, n_vars, k, b, rep):
+    key = [n_vars, k, int(np.float64(b).view(np.uint64)), rep]
+    state = np.random.SeedSequence(master_seed, spawn_key=key).generate_state(1, np.uint64)
+
+    return int(state[0] >> np.uint64(1))  # kept within 63 bits, such that it fits in a signed 64-bit integer
+
+
+"""
+Cache of the instances of a benchmark grid, which holds only the master seed and regenerates the clauses of an instance
+from its seed (see instance_seed) on demand. Optionally, generated instances are also kept on disk as .npy files in
+the given directory, up to a total size beyond which the least recently used are removed, trading disk space for
+generation time when the same instances are run against several solvers. The cache holds no open resources and may be
+passed to worker processes, which share its directory.
+
+Parameters:
+  i.      n_vars : number of variables in every instance
+ ii.      cutoff : the maximum number of clause generation resamples
+iii.       index : uniqueness index of the generated clauses (see ClauseSet); either "hash" or "bloom"
+ iv. master_seed : the master seed from which the seed of every instance is derived
+  v.         dir : optional directory in which to keep generated instances
+ vi.   max_bytes : the maximum total size of the instances kept in dir
+"""
+class InstanceCache:
+    def __init__(self, n_vars, cutoff, index, master_seed, dir=None, max_bytes=1 << 30):
+        self.n_vars = n_vars
+        self.cutoff = cutoff
+        self.index = index
+        self.master_seed = master_seed
+        self.dir = dir
+        self.max_bytes = max_bytes
+
+        if dir is not None:
+            os.makedirs(dir, exist_ok=True)
+
+    def seed(self, k, b, rep):
+        return instance_seed(self.master_seed, self.n_vars, k, b, rep)
+
+    def _path(self, k, seed):
+        return os.path.join(self.dir, "inst_n" + str(self.n_vars) + "_k" + str(k) + "_c" + str(self.cutoff) + "_"
+                            + self.index + "_" + str(seed) + ".npy")
+
+    """
+    Returns the seed of the instance with k literals per clause for the bias b and repetition rep, along with its
+    (m, k) array of clauses, loaded from disk if kept there or generated otherwise. The time spent loading or
+    generating the instance (and the number of clauses rejected as duplicates) is recorded in the optional metrics (see
+    InstanceMetrics).
+    """
+    def get(self, k, b, rep, metrics=None):
+        seed = self.seed(k, b, rep)
+        start = time.perf_counter()
+
+        if self.dir is not None:
+            path = self._path(k, seed)
+            try:
+                clauses_arr = np.load(path)
+                os.utime(path)  # mark as recently used
+
+                if metrics is not None:
+                    metrics.add_phase("load", time.perf_counter() - start)
+
+                return seed, clauses_arr
+            except (OSError, ValueError):  # not kept (or removed since)
+                pass
+
+        clauses_arr, _, n_collisions = generate_clauses(self.n_vars, k, max_var_clauses(k), b, self.cutoff,
+                                                        index=self.index, seed=seed)
+
+        if metrics is not None:
+            metrics.add_phase("generate", time.perf_counter() - start)
+            metrics.count("collisions", int(n_collisions))
+
+        if self.dir is not None:
+            self._put(path, clauses_arr)
+
+        return seed, clauses_arr
+
+    def _put(self, path, clauses_arr):
+        if self.max_bytes < clauses_arr.nbytes:
+            return
+
+        # written under a temporary name and renamed, such that other processes never load a partially written file
+        fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=self.dir)
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, clauses_arr)
+        os.replace(tmp_path, path)
+
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for entry in os.scandir(self.dir):
+            if entry.name.endswith(".npy"):
+                try:
+                    st = entry.stat()
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+                except OSError:  # removed by another process
+                    pass
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+            total = total - size
@@ -0,0 +1,241 @@
+import os
+import json
+import time
+import pstats
+import cProfile
+import resource
+import datetime
+import contextlib
+import tracemalloc
+
+PROFILERS = ["cprofile", "tracemalloc"]
+
+
+"""
+Resets the memory high-water mark of the current process (VmHWM, through /proc/self/clear_refs on Linux), such that
+peak_rss measures the peak from here on; returns whether it could be reset.
+"""
+def reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return False
+
+    return True
+
+
+"""
+Returns the memory high-water mark of the current process in bytes: since the last reset_peak_rss if it could be reset,
+and over the lifetime of the process otherwise (ru_maxrss, which is never reset).
+"""
+def peak_rss():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+"""
+Instrumentation of the pipeline of a single instance (generation, writing, solving, parsing and cleanup), collecting the
+time spent in each phase, counters (eg. the number of clauses rejected as duplicates) and gauges holding high-water
+marks (eg. the maximum resident set size of the solver), which are appended as a single JSON line to an event log once
+the instance is done with. Records are plain data, such that they may be passed between processes along with their
+instance; without an event log, emit() does nothing. The memory high-water mark of the current process is reset when
+the record is created (see reset_peak_rss), such that the peak memory of the instance is measured in the process in
+which it started (eg. a worker handling one instance at a time).
+
+Parameters:
+  i. log_path : optional path to the JSON-lines event log
+ ii.   labels : labels identifying the instance in its event (eg. k, b, rep and seed)
+"""
+class InstanceMetrics:
+    def __init__(self, log_path, **labels):
+        self.log_path = log_path
+        self.labels = labels
+        self.phases = {}
+        self.counters = {}
+        self.gauges = {}
+
+        self._pid = os.getpid()
+        self._reset = reset_peak_rss()
+
+    """
+    Context manager timing a phase, adding to any time already spent in the same phase.
+    """
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.perf_counter() - start)
+
+    def add_phase(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0) + seconds
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name, value):
+        self.gauges[name] = max(self.gauges.get(name, value), value)
+
+    """
+    Records the memory high-water mark (maximum resident set size) of the instance as a gauge, ie. of the current
+    process since the record was created. If the high-water mark could not be reset, or the record was created in
+    another process, the high-water mark over the lifetime of the current process is recorded instead, prefixed by
+    "process_".
+    """
+    def max_rss(self, name="max_rss_bytes"):
+        if self._reset and self._pid == os.getpid():
+            self.gauge(name, peak_rss())
+        else:
+            self.gauge("process_" + name, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+
+    """
+    Records the phases and resource usage of a solver run (see RunResult), suffixed by the solver's index.
+    """
+    def add_run(self, run, i=0):
+        self.add_phase("feed_" + str(i), run.feed_time)
+        self.add_phase("solve_" + str(i), run.wall_time)
+        self.add_phase("parse_" + str(i), run.parse_time)
+        self.count("solver_cpu_seconds", run.cpu_time)
+        self.count("timeouts", int(run.timed_out))
+        self.gauge("solver_max_rss_bytes", run.max_rss * 1024)
+
+    """
+    Appends the record of the instance to the event log, along with its memory high-water mark (see max_rss).
+    """
+    def emit(self):
+        if self.log_path is None:
+            return
+
+        self.max_rss()
+
+        event = {"time": datetime.datetime.now().isoformat(), "pid": os.getpid(), "labels": self.labels,
+                 "phases": self.phases, "counters": self.counters, "gauges": self.gauges}
+
+        # a single write of a whole line to a file opened for appending, such that the events of several processes
+        # sharing the log are never interleaved
+        with open(self.log_path, "a") as f:
+            f.write(json.dumps(event, default=float) + "\n")
+
+
+"""
+Exporter of the events of an event log (see InstanceMetrics) as a Prometheus textfile (eg. for the textfile collector
+of the node exporter), aggregating the time spent in and the number of instances through each phase, the sum of every
+counter and the maximum of every gauge. The log is read incrementally from where the previous update stopped, such
+that events appended by any number of processes are taken into account as they come in.
+
+Parameters:
+  i. log_path : path to the JSON-lines event log
+ ii.     path : path to the Prometheus textfile
+iii.   prefix : prefix of the names of the exported metrics
+"""
+class PrometheusExporter:
+    def __init__(self, log_path, path, prefix="randomsatgen"):
+        self.log_path = log_path
+        self.path = path
+        self.prefix = prefix
+
+        self._offset = 0
+        self._instances = 0
+        self._phase_seconds = {}
+        self._phase_count = {}
+        self._counters = {}
+        self._gauges = {}
+
+    def _read(self):
+        if not os.path.exists(self.log_path):
+            return
+
+        with open(self.log_path, "r") as f:
+            f.seek(self._offset)
+            while True:
+                line = f.readline()
+                if not line.endswith("\n"):  # end of log, or a line still being written
+                    break
+
+                self._offset = f.tell()
+                event = json.loads(line)
+
+                self._instances = self._instances + 1
+                for name, seconds in event["phases"].items():
+                    self._phase_seconds[name] = self._phase_seconds.get(name, 0) + seconds
+                    self._phase_count[name] = self._phase_count.get(name, 0) + 1
+                for name, value in event["counters"].items():
+                    self._counters[name] = self._counters.get(name, 0) + value
+                for name, value in event["gauges"].items():
+                    self._gauges[name] = max(self._gauges.get(name, value), value)
+
+    """
+    Reads any events appended to the log since the last update, and writes the textfile anew.
+    """
+    def update(self):
+        self._read()
+
+        p = self.prefix
+        lines = ["# TYPE " + p + "_instances_total counter", p + "_instances_total " + str(self._instances),
+                 "# TYPE " + p + "_phase_seconds_total counter"]
+        lines += [p + '_phase_seconds_total{phase="' + name + '"} ' + repr(float(seconds))
+                  for name, seconds in sorted(self._phase_seconds.items())]
+        lines.append("# TYPE " + p + "_phase_count_total counter")
+        lines += [p + '_phase_count_total{phase="' + name + '"} ' + str(n)
+                  for name, n in sorted(self._phase_count.items())]
+        for name, value in sorted(self._counters.items()):
+            lines += ["# TYPE " + p + "_" + name + "_total counter", p + "_" + name + "_total " + repr(float(value))]
+        for name, value in sorted(self._gauges.items()):
+            lines += ["# TYPE " + p + "_" + name + " gauge", p + "_" + name + " " + repr(float(value))]
+
+        # written under a temporary name and renamed, such that the collector never reads a partially written file
+        with open(self.path + ".tmp", "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(self.path + ".tmp", self.path)
+
+
+"""
+Context manager profiling the enclosed code with the given profiler, if any, saving the profile to the given path (with
+an extension for the profiler): cProfile statistics (.prof, readable by pstats or snakeviz) or the top allocation sites
+and peak traced memory from tracemalloc (.txt). The peak traced memory is also recorded as a gauge of the given metrics.
+
+Parameters:
+  i. profiler : any of PROFILERS, or None to run the enclosed code as is
+ ii.     path : path of the profile, without extension
+iii.  metrics : optional InstanceMetrics in which to record the peak traced memory
+"""
+@contextlib.contextmanager
+def profiled(profiler, path, metrics=None):
+    if profiler == "cprofile":
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            profile.dump_stats(path + ".prof")
+
+            with open(path + ".txt", "w") as f:
+                pstats.Stats(profile, stream=f).sort_stats("cumulative").print_stats(40)
+    elif profiler == "tracemalloc":
+        tracemalloc.start(25)
+        try:
+            yield
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            if metrics is not None:
+                metrics.gauge("traced_peak_bytes", peak)
+
+            with open(path + ".txt", "w") as f:
+                f.write("Peak traced memory: " + str(peak) + " bytes\n\n")
+                for stat in snapshot.statistics("lineno")[:40]:
+                    f.write(str(stat) + "\n")
+    else:
+        yield
@@ -0,0 +1,110 @@
+import numpy as np
+
+from core.CoreUtils import IncidenceIndex
+from core.Runner import RunResult
+from core.Metrics import peak_rss, reset_peak_rss
+
+import time
+
+"""
+Layout of the statistics of a run, as read from the solver's csv file by read_stats: t_read, n, m, l, t_solve,
+n_threads, n_iterations.
+"""
+STATS_DTYPE = np.dtype("f8,i8,i8,i8,f8,i8,i8")
+
+"""
+Selects a maximal independent set of the given clauses (ie. no two of which share a variable), by repeatedly drawing a
+random priority for every remaining clause and selecting those whose priority is the lowest over all their variables,
+before discarding the clauses sharing a variable with those selected.
+"""
+def _independent_set(rng, var_idx, candidates, n_vars):
+    selected = []
+    blocked = np.zeros(n_vars, dtype=bool)
+
+    while len(candidates):
+        priority = rng.random(len(candidates))
+        lowest = np.full(n_vars, np.inf)
+        np.minimum.at(lowest, var_idx[candidates].ravel(), np.repeat(priority, var_idx.shape[1]))
+
+        won = (lowest[var_idx[candidates]] == priority[:, None]).all(axis=1)
+        selected.append(candidates[won])
+        blocked[var_idx[candidates[won]].ravel()] = True
+
+        candidates = candidates[~won]
+        candidates = candidates[~blocked[var_idx[candidates]].any(axis=1)]
+
+    return np.concatenate(selected) if selected else candidates
+
+
+"""
+In-process reference implementation of the parallel Moser-Tardos resampling algorithm, for instances small enough that
+the cost of running an external solver is dominated by process startup and file I/O. Starting from a random assignment,
+every round selects a maximal independent set of the violated clauses and resamples all of their variables at once; the
+clauses which may have become violated are then found through the incidence index (see IncidenceIndex) and checked
+with array operations, such that no round scans the whole instance.
+
+The number of iterations is the total number of clauses resampled, as bounded in expectation by the Moser-Tardos
+analysis (em / (2^k - ke) under the ALLL conditions) irrespective of the order in which clauses are resampled.
+
+Parameters:
+  i.        clauses : (m, k) array of clauses, as generated by generate_clauses
+ ii.         n_vars : number of variables in instance
+iii.        timeout : optional timeout in seconds
+ iv. max_iterations : optional maximum number of iterations, beyond which the solve is abandoned
+  v.           seed : optional seed of the random assignment and resamples
+
+Returns the statistics of the solve in the layout of read_stats (None if the timeout was met), the satisfying
+assignment (or the last assignment, if abandoned) as a boolean array indexed by variable and the number of rounds.
+"""
+def solve(clauses, n_vars, timeout=None, max_iterations=None, seed=None):
+    start = time.perf_counter()
+    rng = np.random.default_rng(seed)
+
+    clauses = np.asarray(clauses)
+    m, k = clauses.shape
+    var_idx = np.abs(clauses).astype(np.int64) - 1
+    want = 0 < clauses  # the value of the variable satisfying each literal
+    index = IncidenceIndex(var_idx, n_vars)
+
+    assignment = rng.integers(0, 2, n_vars, dtype=np.int8).astype(bool)
+    violated = ~(assignment[var_idx] == want).any(axis=1)
+    t_read = time.perf_counter() - start
+
+    n_iterations = 0
+    n_rounds = 0
+    start = time.perf_counter()
+    while True:
+        candidates = np.flatnonzero(violated)
+        if not len(candidates) or (max_iterations is not None and max_iterations < n_iterations):
+            break
+
+        if timeout is not None and timeout <= time.perf_counter() - start:
+            return None, assignment, n_rounds
+
+        resampled = _independent_set(rng, var_idx, candidates, n_vars)
+        vars = np.unique(var_idx[resampled].ravel())
+        assignment[vars] = rng.integers(0, 2, len(vars), dtype=np.int8).astype(bool)
+
+        touched = index.clauses_of(vars)
+        violated[touched] = ~(assignment[var_idx[touched]] == want[touched]).any(axis=1)
+
+        n_iterations = n_iterations + len(resampled)
+        n_rounds = n_rounds + 1
+
+    stats = np.array([(t_read, n_vars, m, k, time.perf_counter() - start, 1, n_iterations)], dtype=STATS_DTYPE)
+
+    return stats, assignment, n_rounds
+
+
+"""
+Runs the reference solver (see solve) in the current process, returning its outcome as a RunResult (as for a run of an
+external solver by SolverRunner), with the CPU time of the solve and the maximum resident set size of the process
+during the solve (over the lifetime of the process where its high-water mark cannot be reset, see reset_peak_rss).
+"""
+def run(clauses, n_vars, timeout=None, max_iterations=None, seed=None):
+    reset_peak_rss()
+    start, cpu_start = time.monotonic(), time.process_time()
+    stats, _, _ = solve(clauses, n_vars, timeout, max_iterations, seed)
+
+    return RunResult(stats, stats is None, 0, time.process_time() - cpu_start, peak_rss() // 1024,
+                     time.monotonic() - start, 0.0, 0.0)
@@ -0,0 +1,225 @@
+import json
+import time
+import queue
+import smtplib
+import datetime
+import threading
+import urllib.request
+
+"""
+Sink sending notifications by email through an SMTP server, over a single connection kept open between notifications
+(checked with NOOP before every use, and opened again if the server dropped it).
+
+Parameters:
+  i.     host : SMTP server address
+ ii.     port : SMTP server port
+iii.   sender : address from which notifications are sent
+ iv.       to : list of addresses to which notifications are sent (the sender by default)
+  v. password : optional password of the sender, with which to log in
+ vi.      tls : whether to upgrade the connection with STARTTLS (eg. not for a local SMTP stand-in)
+vii.  timeout : timeout in seconds of every operation on the connection
+"""
+class SMTPSink:
+    def __init__(self, host, port, sender, to=None, password=None, tls=True, timeout=60):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.to = to or [sender]
+        self.password = password
+        self.tls = tls
+        self.timeout = timeout
+
+        self._server = None
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            server.ehlo()
+            if self.tls:
+                server.starttls()
+                server.ehlo()
+            if self.password:
+                server.login(self.sender, self.password)
+        except Exception:
+            server.close()
+            raise
+
+        return server
+
+    def send(self, subject, text):
+        if self._server is not None:
+            try:
+                self._server.noop()
+            except (smtplib.SMTPException, OSError):  # dropped by the server since the last notification
+                self.close()
+
+        if self._server is None:
+            self._server = self._connect()
+
+        message = "From: %s\nTo: %s\nSubject: %s\n\n%s" % (self.sender, ", ".join(self.to), subject, text)
+        try:
+            self._server.sendmail(self.sender, self.to, message)
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                self._server.close()
+
+            self._server = None
+
+
+"""
+Sink appending notifications to a file, eg. for testing notifications offline.
+"""
+class FileSink:
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, subject, text):
+        with open(self.path, "a") as f:
+            f.write(subject + "\n\n" + text + "\n")
+
+    def close(self):
+        pass
+
+
+"""
+Sink posting notifications as JSON objects holding their subject and text to a webhook.
+"""
+class WebhookSink:
+    def __init__(self, url, timeout=60):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, subject, text):
+        request = urllib.request.Request(self.url, json.dumps({"subject": subject, "text": text}).encode(),
+                                         {"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+    def close(self):
+        pass
+
+
+"""
+Returns the sink described by the given specification: "smtp" for an SMTP server requiring STARTTLS and a login (as
+for a mail service), "smtp://host:port" for a plain SMTP server (eg. a local stand-in), "file:path" for a file, or an
+http(s) URL for a webhook.
+
+Parameters:
+  i.     spec : specification of the sink
+ ii.    email : address from and to which emails are sent
+iii. password : password of the email address
+ iv.     host : SMTP server address (for "smtp")
+  v.     port : SMTP server port (for "smtp")
+"""
+def make_sink(spec, email="", password="", host="smtp.gmail.com", port=587):
+    if spec == "smtp":
+        return SMTPSink(host, port, email, password=password)
+    elif spec.startswith("smtp://"):
+        host, _, port = spec[7:].partition(":")
+        return SMTPSink(host, int(port or 25), email or "RandomSATGen@localhost", tls=False)
+    elif spec.startswith("file:"):
+        return FileSink(spec[5:])
+    elif spec.startswith("http://") or spec.startswith("https://"):
+        return WebhookSink(spec)
+
+    raise ValueError("Unknown notification sink: " + spec)
+
+
+_STOP = object()
+
+"""
+Background notification service, to which summaries of solved instances are queued without blocking the caller. A
+worker thread collects the summaries into batches, sending a batch to the sink once the given interval has elapsed
+since the last notification or once the batch holds the given number of summaries. Sending a batch which fails (eg.
+as the mail server does not respond) is retried with exponential backoff, while summaries keep being collected into
+the same batch; failures are only reported, and never stop the caller. Use as a context manager, such that any batch
+left is sent (once) on exiting.
+
+Parameters:
+  i.        sink : sink to which batches are sent (see make_sink)
+ ii.    interval : the minimum time in seconds between notifications
+iii.   max_batch : optional number of summaries at which a batch is sent irrespective of the interval
+ iv.     backoff : the time in seconds before the first retry of a failed notification, doubled on every failure
+  v. max_backoff : the maximum time in seconds between retries
+"""
+class Notifier:
+    def __init__(self, sink, interval=3600, max_batch=None, backoff=30, max_backoff=3600):
+        self.sink = sink
+        self.interval = interval
+        self.max_batch = max_batch
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    """
+    Queues the summary of a solved instance, to be sent with the next batch.
+    """
+    def notify(self, summary):
+        self._queue.put(summary)
+
+    def _send(self, batch):
+        subject = "RandomSATGen Update (" + datetime.datetime.now().strftime("%d/%m/%Y %H:%M:%S") + ")"
+        self.sink.send(subject, "SAT instances found! Details:\n\n" + "".join(line + "\n" for line in batch))
+
+    def _run(self):
+        batch = []
+        last_sent = time.monotonic()
+        retry_at, delay = 0, self.backoff
+        stopping = False
+
+        while not stopping:
+            timeout = None
+            if batch:  # wait until the batch is due (or a retry, if later)
+                due = last_sent + self.interval
+                if self.max_batch is not None and self.max_batch <= len(batch):
+                    due = 0
+                timeout = max(0, max(due, retry_at) - time.monotonic())
+
+            try:
+                item = self._queue.get(timeout=timeout)
+                if item is _STOP:
+                    stopping = True
+                else:
+                    batch.append(item)
+                    continue
+            except queue.Empty:
+                pass
+
+            now = time.monotonic()
+            if not batch or (not stopping and (now < retry_at or (now < last_sent + self.interval and (
+                    self.max_batch is None or len(batch) < self.max_batch)))):
+                continue
+
+            try:
+                self._send(batch)
+                batch, last_sent, delay = [], now, self.backoff
+            except Exception as e:
+                print("Unable to communicate with notification service (" + str(e) + ")" + (
+                    ", dropping " + str(len(batch)) + " notifications..." if stopping
+                    else ", retrying in " + str(delay) + " seconds..."))
+                retry_at, delay = now + delay, min(2 * delay, self.max_backoff)
+
+        self.sink.close()
+
+    """
+    Sends any batch left and stops the worker, waiting for it to finish.
+    """
+    def close(self):
+        self._queue.put(_STOP)
+        self._thread.join()
@@ -0,0 +1,217 @@
+import numpy as np
+
+import os
+import re
+import csv
+import json
+
+from concurrent.futures import ProcessPoolExecutor
+
+"""
+Plotting of the results of the analysis sweeps, as a render step separate from the sweeps: every plot is drawn from
+the CSV files recorded for a value of k (see record_k of BoundAnalysis and ParallelAnalysis), along with the JSON file
+of parameters written next to them (see write_meta), such that the sweeps never import matplotlib and plots can be
+redrawn at any time without running the sweep again.
+"""
+
+_ANALYSIS = re.compile(r"^(analysis|parallel_analysis)_n\d+_k\d+\.csv$")
+
+_plt = None
+
+
+"""
+Imports matplotlib on first use only, with the non-interactive Agg backend such that plots are rendered headless.
+"""
+def _pyplot():
+    global _plt
+
+    if _plt is None:
+        import matplotlib
+        matplotlib.use("Agg")
+        from matplotlib import pyplot
+        _plt = pyplot
+
+    return _plt
+
+
+def _read_rows(path):
+    with open(path, newline="") as f:
+        return [np.array(row, dtype=float) for row in csv.reader(f)]
+
+
+"""
+Writes the parameters of the analysis of a value of k needed to plot its results, next to its CSV files.
+
+Parameters:
+  i. csv_name : name of the CSV file of the analysis (without extension)
+ ii.     meta : dict holding n (the number of variables), k, samples (the number of bias values), b_max (see record_k)
+                and backend, along with threads for the parallel analysis
+"""
+def write_meta(csv_name, meta):
+    with open(csv_name + ".json", "w") as f:
+        json.dump(meta, f)
+
+
+def _title(meta):
+    E = 1 - meta["b_max"] if meta["b_max"] != 0 else 1 - (1 / meta["samples"])
+
+    return "n = " + str(meta["n"]) + ", k = " + str(meta["k"]) + ", $\\delta_{\\mathrm{max}}$ = " + str(E)
+
+
+"""
+Plots the results of the bound analysis of a value of k: the iterations against the number of clauses along with the
+Moser-Tardos bound (and the iterations of the reference solver, when cross-checking), and the solve time against the
+effective violation delta.
+"""
+def plot_bound(csv_name):
+    plt = _pyplot()
+    with open(csv_name + ".json") as f:
+        meta = json.load(f)
+
+    b_arr, t_arr, m_arr, i_arr, t_var, t_ci, i_var, i_ci, n_arr, d_arr, delta_arr, r_arr = _read_rows(csv_name + ".csv")
+    k = meta["k"]
+
+    fig, (ax) = plt.subplots(1, 1)
+    try:
+        fig.suptitle(_title(meta))
+
+        ax.plot(m_arr, i_arr, 'r', label='Empirical data')
+        ax.plot(m_arr, i_arr, 'r+')
+
+        if meta["backend"] == "cross-check":
+            ax.plot(m_arr, r_arr, 'g--', label='Reference (Moser-Tardos)')
+
+        upperBound = np.multiply((np.e / (2**k - (k*np.e))),  m_arr)
+        ax.plot(m_arr, upperBound, 'b', label="$i(m) = \\dfrac{em}{2^k - ke}$")
+
+        ax.legend()
+        ax.set_xlabel('$m$' + " (clauses)")
+        ax.set_ylabel('$i$' + " (iterations)")
+
+        fig.set_size_inches(9, 6)
+        fig.tight_layout()
+        fig.savefig(csv_name + ".pdf", format='pdf', bbox_inches='tight')
+    finally:
+        plt.close(fig)
+
+    fig, (ax) = plt.subplots(1, 1)
+    try:
+        fig.suptitle(_title(meta))
+
+        ax.plot(delta_arr, t_arr, 'r', label='Empirical data')
+        ax.plot(delta_arr, t_arr, 'r+')
+        ax.axvline(0, color='b', linestyle='--', label="$e(d_{\\mathrm{max}} + 1) = 2^k$")
+
+        ax.legend()
+        ax.set_xlabel("$\\delta = e(d_{\\mathrm{max}} + 1) / 2^k - 1$")
+        ax.set_ylabel('$t$' + " (seconds)")
+
+        fig.set_size_inches(9, 6)
+        fig.tight_layout()
+        fig.savefig(csv_name + "_delta.pdf", format='pdf', bbox_inches='tight')
+    finally:
+        plt.close(fig)
+
+
+"""
+Plots the results of the parallel analysis of a value of k: the serial and parallel solve times against the number of
+clauses, and the speedup and efficiency against the number of threads if several thread counts were analysed.
+"""
+def plot_parallel(csv_name):
+    plt = _pyplot()
+    with open(csv_name + ".json") as f:
+        meta = json.load(f)
+
+    threads = meta["threads"]
+    rows = _read_rows(csv_name + ".csv")
+    ts_arr, tp_arr, m_arr = rows[1], rows[2:2 + len(threads)], rows[2 + len(threads)]
+
+    fig, (ax) = plt.subplots(1, 1)
+    try:
+        fig.suptitle(_title(meta))
+
+        ax.plot(m_arr, ts_arr, 'r+', label='Sequential ALLL')
+        ax.plot(m_arr, ts_arr, 'r')
+        for j, p in enumerate(threads):
+            colour = 'b' if len(threads) == 1 else plt.cm.viridis(j / len(threads))
+            ax.plot(m_arr, tp_arr[j], '+', color=colour,
+                    label='Parallel ALLL' if len(threads) == 1 else 'Parallel ALLL ($p$ = ' + str(p) + ')')
+            ax.plot(m_arr, tp_arr[j], color=colour)
+
+        ax.legend()
+        ax.set_xlabel('$m$' + " (clauses)")
+        ax.set_ylabel('$t$' + " (milliseconds)")
+
+        fig.set_size_inches(9, 6)
+        fig.tight_layout()
+        fig.savefig(csv_name + ".pdf", format='pdf', bbox_inches='tight')
+    finally:
+        plt.close(fig)
+
+    speedup_name = csv_name.replace("parallel_analysis_", "parallel_speedup_")
+    if len(threads) == 1 or not os.path.exists(speedup_name + ".csv"):
+        return
+
+    rows = _read_rows(speedup_name + ".csv")
+    b_arr = rows[0]
+    speedup = np.array(rows[1:1 + len(threads)]).T  # speedup for every bias value (rows) and number of threads
+    efficiency = np.array(rows[1 + len(threads):]).T
+
+    fig, (ax_s, ax_e) = plt.subplots(1, 2)
+    try:
+        fig.suptitle(_title(meta))
+
+        for i, delta in enumerate(b_arr):  # one curve for every bias value, coloured by the degree delta
+            ax_s.plot(threads, speedup[i], color=plt.cm.viridis(delta), marker='+')
+            ax_e.plot(threads, efficiency[i], color=plt.cm.viridis(delta), marker='+')
+
+        ax_s.plot(threads, threads, 'k--', label='Linear speedup')
+        ax_s.legend()
+        ax_s.set_xlabel('$p$' + " (threads)")
+        ax_s.set_ylabel('$S$' + " (speedup)")
+        ax_e.set_xlabel('$p$' + " (threads)")
+        ax_e.set_ylabel('$E$' + " (efficiency)")
+        fig.colorbar(plt.cm.ScalarMappable(cmap=plt.cm.viridis), ax=[ax_s, ax_e], label="$\\delta$")
+
+        fig.set_size_inches(12, 6)
+        fig.savefig(speedup_name + ".pdf", format='pdf', bbox_inches='tight')
+    finally:
+        plt.close(fig)
+
+
+"""
+Plots the results of an analysis of a value of k (bound or parallel, by the name of its CSV file).
+"""
+def plot(csv_name):
+    if os.path.basename(csv_name).startswith("parallel_analysis_"):
+        plot_parallel(csv_name)
+    else:
+        plot_bound(csv_name)
+
+    return csv_name
+
+
+"""
+Returns the names (without extension) of the CSV files of every analysis in a directory which can be plotted (ie.
+along with their JSON file of parameters), in order.
+"""
+def find_analyses(dir):
+    names = []
+    for entry in sorted(os.scandir(dir), key=lambda e: e.name):
+        name = os.path.join(dir, entry.name[:-4])
+        if _ANALYSIS.match(entry.name) and os.path.exists(name + ".json"):
+            names.append(name)
+
+    return names
+
+
+"""
+Plots the results of the given analyses in a single batch, in as many worker processes as given (each importing
+matplotlib once for all the plots it draws), returning the names of the analyses plotted in order.
+"""
+def render(csv_names, jobs=1):
+    if jobs <= 1 or len(csv_names) <= 1:
+        return [plot(csv_name) for csv_name in csv_names]
+
+    with ProcessPoolExecutor(min(jobs, len(csv_names))) as executor:
+        return list(executor.map(plot, csv_names))
@@ -0,0 +1,172 @@
+from core.CoreUtils import read_stats
+
+import os
+import time
+import signal
+import asyncio
+import threading
+import subprocess
+import collections
+
+from concurrent.futures import ThreadPoolExecutor
+
+"""
+Outcome of a single solver run:
+  i.      stats : statistics read from the solver's csv file (see read_stats), or None if the run timed out or left no
+                  (readable) csv file
+ ii.  timed_out : whether the run was killed on meeting the timeout
+iii. returncode : exit code of the solver (negative for the signal which killed it)
+ iv.   cpu_time : user and system CPU time of the solver, in seconds (including any threads it created)
+  v.    max_rss : maximum resident set size of the solver, in kilobytes
+ vi.  wall_time : wall clock time of the run, in seconds
+vii.  feed_time : time spent feeding the instance to the solver (stdin and fifo transports), in seconds
+viii. parse_time : time spent reading the solver's csv file, in seconds
+"""
+RunResult = collections.namedtuple("RunResult", ["stats", "timed_out", "returncode", "cpu_time", "max_rss",
+                                                 "wall_time", "feed_time", "parse_time"])
+
+
+def _timed(f, *args):
+    start = time.perf_counter()
+    f(*args)
+
+    return time.perf_counter() - start
+
+
+def _kill_group(pgid):
+    try:
+        os.killpg(pgid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):  # the group has already exited
+        pass
+
+
+def _exit_code(status):  # as os.waitstatus_to_exitcode (Python 3.9+)
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+
+    return os.WEXITSTATUS(status)
+
+
+def _available_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+
+    return os.cpu_count() or 1  # eg. on macOS, where the affinity of a process cannot be queried
+
+
+def _read_stats(cnf_file_name):
+    try:
+        stats = read_stats(cnf_file_name)
+    except (OSError, ValueError):  # no csv file was produced (or it is incomplete)
+        return None
+
+    return stats if len(stats) else None
+
+
+"""
+Runner of solvers on generated instances (see SolverInstance), driving any number of runs at once from an asyncio event
+loop on a background thread, of which at most max_concurrent are in flight at any time (waiting on a semaphore
+otherwise). Every solver is launched in a process group of its own, which is killed as a whole on meeting the timeout
+(and once the solver exits), such that no processes forked by a solver survive its run. Each solver is reaped by
+os.wait4, capturing the resource usage of the run.
+
+Parameters:
+  i. max_concurrent : the maximum number of runs in flight at once (the number of available cores by default)
+"""
+class SolverRunner:
+    def __init__(self, max_concurrent=None):
+        self.max_concurrent = max_concurrent or _available_cpus()
+
+        # every run blocks a thread waiting on the solver, and another feeding it for the stdin and fifo transports
+        self._threads = ThreadPoolExecutor(2 * self.max_concurrent)
+        self._loop = asyncio.new_event_loop()
+        self._semaphore = None
+
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+
+    async def _run(self, instance, solver, timeout, cpus):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            instance.remove_outputs()  # clear the outputs of any previous run on the same instance
+
+            # the solver is pinned by taskset before it is executed, such that all of its threads inherit the
+            # affinity, without running any code in the child before exec (which may deadlock in a threaded process)
+            command = solver + [instance.path]
+            if cpus is not None:
+                command = ["taskset", "-c", ",".join(str(cpu) for cpu in cpus)] + command
+
+            start = time.monotonic()
+            proc = subprocess.Popen(command, stdin=subprocess.PIPE if instance.mode == "stdin" else None,
+                                    start_new_session=True)
+
+            feeder = None
+            if instance.mode in ["stdin", "fifo"]:
+                feeder = loop.run_in_executor(self._threads, _timed, instance.feed, proc)
+
+            waiter = loop.run_in_executor(self._threads, os.wait4, proc.pid, 0)
+            timed_out = False
+            try:
+                _, status, usage = await asyncio.wait_for(asyncio.shield(waiter), timeout)
+            except asyncio.TimeoutError:
+                timed_out = True
+                _kill_group(proc.pid)
+                _, status, usage = await waiter
+
+            _kill_group(proc.pid)  # any processes left behind by the solver
+            proc.returncode = _exit_code(status)  # reaped here rather than by the Popen object
+            wall_time = time.monotonic() - start
+
+            feed_time = 0.0 if feeder is None else await feeder
+
+        start = time.perf_counter()
+        stats = None if timed_out else _read_stats(instance.cnf_file_name)
+        parse_time = time.perf_counter() - start
+
+        return RunResult(stats, timed_out, proc.returncode, usage.ru_utime + usage.ru_stime, usage.ru_maxrss,
+                         wall_time, feed_time, parse_time)
+
+    """
+    Submits a run of a solver on an instance, returning a concurrent.futures.Future of its RunResult. The solver's
+    output files are left in place until the next run, keep() or close() of the instance.
+
+    Parameters:
+      i. instance : the instance (SolverInstance) to run
+     ii.   solver : solver command (path to the solver along with any arguments), to which the instance path is appended
+    iii.  timeout : timeout in seconds
+     iv.     cpus : optional list of cores to which the solver (and any threads it creates) is pinned, through
+                    taskset (Linux only)
+    """
+    def submit(self, instance, solver, timeout, cpus=None):
+        return asyncio.run_coroutine_threadsafe(self._run(instance, solver, timeout, cpus), self._loop)
+
+    """
+    Runs a solver on an instance until a solution is found or the timeout is met (see submit), returning its RunResult.
+    """
+    def run(self, instance, solver, timeout, cpus=None):
+        return self.submit(instance, solver, timeout, cpus).result()
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._threads.shutdown()
+
+
+_runner = None  # runner of the current process (see default_runner)
+_runner_pid = None
+
+"""
+Runner shared by all runs of the current process, created on first use (and again in any forked worker process, to
+which the thread of the parent's runner does not carry over).
+"""
+def default_runner():
+    global _runner, _runner_pid
+
+    if _runner is None or _runner_pid != os.getpid():
+        _runner, _runner_pid = SolverRunner(), os.getpid()
+
+    return _runner
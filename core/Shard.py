@@ -0,0 +1,195 @@
+from core.Instances import new_master_seed
+
+import os
+import re
+import json
+import socket
+import argparse
+import datetime
+
+_LOG = re.compile(r"^shard_\d+_of_\d+\.jsonl$")
+
+
+"""
+Parses a shard given on the command line as "i/N" (the i-th of N shards, counting from 1), returning the pair (i, N).
+"""
+def parse_shard(spec):
+    try:
+        i, n = (int(x) for x in spec.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid shard '" + spec + "' (expected i/N, eg. 1/4)")
+
+    if not 1 <= i <= n:
+        raise argparse.ArgumentTypeError("invalid shard '" + spec + "' (expected 1 <= i <= N)")
+
+    return i, n
+
+
+"""
+Work log of a shard of an analysis sweep run over several nodes, coordinated through files in a directory shared by
+all nodes (eg. over NFS) rather than through any service. Every shard owns a fixed part of the grid of cells of the
+sweep (see owns), and appends the result of every cell it runs as a JSON line to a log of its own, such that no file is
+ever written by more than one node:
+
+  sweep.json             the master seed and parameters of the sweep, published by the first shard to start (see
+                         master_seed) and checked by every other shard, such that all shards run the same grid
+  shard_<i>_of_<N>.jsonl the work log of shard i, from which an interrupted shard resumes and which the other shards
+                         tail to learn of the bias values at which cells failed (see limits)
+
+The logs of all shards are combined once all shards are done (see results and merge_shards). Use as a context manager.
+
+Parameters:
+  i.   dir : path to the shared directory, which is created if it does not exist
+ ii. shard : the pair (i, N) of the shard run on this node (see parse_shard), or None to only read the logs (eg. to
+             merge them)
+"""
+class ShardLog:
+    def __init__(self, dir, shard=None):
+        os.makedirs(dir, exist_ok=True)
+        self.dir = dir
+        self.shard = shard
+
+        self._offsets = {}  # offset up to which every log was read by limits
+        self._limits = {}
+        self._log = None
+        if shard is not None:
+            self._log = open(os.path.join(dir, "shard_%d_of_%d.jsonl" % shard), "a+")
+            self._log.seek(0, os.SEEK_END)
+            if 0 < self._log.tell():  # terminate any line left incomplete by an interrupted shard
+                self._log.seek(self._log.tell() - 1)
+                if self._log.read(1) != "\n":
+                    self._log.write("\n")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    """
+    Returns the master seed of the sweep, coordinating the parameters of the sweep across shards: the first shard to
+    start publishes the given seed (or a fresh one if None) along with the given parameters, atomically (by linking a
+    complete file into place, which fails if another shard did so first), while every other shard (and the merge) reads
+    the published ones, raising a ValueError if any given parameter (or an explicitly given seed) differs from them.
+    """
+    def master_seed(self, seed=None, **params):
+        path = os.path.join(self.dir, "sweep.json")
+        if self.shard is not None and not os.path.exists(path):
+            tmp = path + "." + socket.gethostname() + "." + str(os.getpid()) + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(dict(params, seed=new_master_seed() if seed is None else seed), f)
+
+            try:
+                os.link(tmp, path)
+            except FileExistsError:  # published by another shard in the meantime
+                pass
+            finally:
+                os.remove(tmp)
+
+        try:
+            with open(path) as f:
+                published = json.load(f)
+        except FileNotFoundError:
+            raise ValueError("No sweep was started in " + self.dir)
+
+        differ = [key for key, value in params.items() if published.get(key) != value]
+        if seed is not None and seed != published["seed"]:
+            differ.append("seed")
+        if differ:
+            raise ValueError("Parameters differ from those of the sweep started in " + self.dir + ": "
+                             + ", ".join(differ))
+
+        return published["seed"]
+
+    """
+    Whether a cell belongs to this shard, given its k and its index in the grid of cells of k (ie. the index of its
+    bias value times the number of repetitions, plus its repetition). Cells are dealt round robin, such that every
+    shard runs about as many cells of every bias value; the shard of the first cell rotates with k.
+    """
+    def owns(self, k, cell):
+        i, n = self.shard
+
+        return (k + cell) % n == i - 1
+
+    def _logs(self):
+        return [os.path.join(self.dir, entry.name) for entry in sorted(os.scandir(self.dir), key=lambda e: e.name)
+                if _LOG.match(entry.name)]
+
+    def _read(self, path, offset=0):
+        with open(path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+
+        end = data.rfind(b"\n") + 1  # a line still being written is left for the next read
+        entries = []
+        for line in data[:end].splitlines():
+            try:
+                entries.append(json.loads(line))
+            except ValueError:  # left incomplete by an interrupted shard
+                pass
+
+        return entries, offset + end
+
+    """
+    Returns the cells already recorded in the log of this shard, as (k, bias index, repetition) triples.
+    """
+    def recorded(self):
+        entries, _ = self._read(self._log.name)
+
+        return {(e["k"], e["bi"], e["rep"]) for e in entries}
+
+    """
+    Returns, for every k at which a cell failed in any shard so far, the index of the lowest bias value at which a cell
+    failed. Since the bias at which a cell first fails is b_max, no cell at or beyond these bias values needs to be run
+    by any shard. Every log is read incrementally, from where the last call left off.
+    """
+    def limits(self):
+        for path in self._logs():
+            entries, self._offsets[path] = self._read(path, self._offsets.get(path, 0))
+            for e in entries:
+                if e["failed"]:
+                    self._limits[e["k"]] = min(self._limits.get(e["k"], e["bi"]), e["bi"])
+
+        return self._limits
+
+    """
+    Records the result of a cell (see run_cell) in the log of this shard, flushing it to disk at once.
+
+    Parameters:
+      i.      k : the number of literals in a clause
+     ii.     bi : the index of the bias value of the cell
+    iii.    rep : the repetition of the cell
+     iv.      b : the bias value of the cell
+      v.   seed : the seed of the instance of the cell
+     vi. result : the result of the cell
+    vii. failed : whether the cell failed (see cell_failed)
+    """
+    def record(self, k, bi, rep, b, seed, result, failed):
+        n_clauses, stats, structure = result
+        self._log.write(json.dumps({"k": k, "bi": bi, "rep": rep, "b": float(b), "seed": seed,
+                                    "n_clauses": n_clauses, "stats": stats, "structure": structure, "failed": failed,
+                                    "host": socket.gethostname(), "finished": datetime.datetime.now().isoformat()})
+                        + "\n")
+        self._log.flush()
+        os.fsync(self._log.fileno())
+
+        if failed:
+            self._limits[k] = min(self._limits.get(k, bi), bi)
+
+    """
+    Returns the results of every cell recorded by any shard, keyed by (k, bias index, repetition). A cell recorded more
+    than once (eg. by two shards run with the same index by mistake) keeps its first result.
+    """
+    def results(self):
+        results = {}
+        for path in self._logs():
+            entries, _ = self._read(path)
+            for e in entries:
+                results.setdefault((e["k"], e["bi"], e["rep"]), (e["n_clauses"], e["stats"], e["structure"]))
+
+        return results
+
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
@@ -0,0 +1,178 @@
+import math
+import statistics
+
+_A = [-3.969683028665376e+01, 2.209460984245205e+02, -2.759285104469687e+02, 1.383577518672690e+02,
+      -3.066479806614716e+01, 2.506628277459239e+00]
+_B = [-5.447609879822406e+01, 1.615858368580409e+02, -1.556989798598866e+02, 6.680131188771972e+01,
+      -1.328068155288572e+01]
+_C = [-7.784894002430293e-03, -3.223964580411365e-01, -2.400758277161838e+00, -2.549732539343734e+00,
+      4.374664141464968e+00, 2.938163982698783e+00]
+_D = [7.784695709041462e-03, 3.224671290700398e-01, 2.445134137142996e+00, 3.754408661907416e+00]
+
+"""
+Quantile of the standard normal distribution at probability p, by Acklam's rational approximation (accurate to within
+1.2e-9 relative error).
+"""
+def normal_quantile(p):
+    if p < 0.02425:
+        q = math.sqrt(-2 * math.log(p))
+        return (((((_C[0] * q + _C[1]) * q + _C[2]) * q + _C[3]) * q + _C[4]) * q + _C[5]) \
+            / ((((_D[0] * q + _D[1]) * q + _D[2]) * q + _D[3]) * q + 1)
+    if 1 - 0.02425 < p:
+        return -normal_quantile(1 - p)
+
+    q = p - 0.5
+    r = q * q
+
+    return (((((_A[0] * r + _A[1]) * r + _A[2]) * r + _A[3]) * r + _A[4]) * r + _A[5]) * q \
+        / (((((_B[0] * r + _B[1]) * r + _B[2]) * r + _B[3]) * r + _B[4]) * r + 1)
+
+
+"""
+Continued fraction of the regularised incomplete beta function, evaluated by the modified Lentz method.
+"""
+def _beta_cf(a, b, x):
+    tiny = 1e-300
+    c, d = 1.0, 1 - (a + b) * x / (a + 1)
+    d = 1 / (d if tiny < abs(d) else tiny)
+    h = d
+
+    for m in range(1, 1000):
+        for aa in [m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+                   -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1))]:
+            d = 1 + aa * d
+            d = 1 / (d if tiny < abs(d) else tiny)
+            c = 1 + aa / c
+            c = c if tiny < abs(c) else tiny
+            h = h * d * c
+
+        if abs(d * c - 1) < 1e-15:
+            break
+
+    return h
+
+
+"""
+Regularised incomplete beta function I_x(a, b).
+"""
+def _inc_beta(a, b, x):
+    if x <= 0:
+        return 0.0
+    if 1 <= x:
+        return 1.0
+
+    front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log(1 - x))
+    if x < (a + 1) / (a + b + 2):
+        return front * _beta_cf(a, b, x) / a
+
+    return 1 - front * _beta_cf(b, a, 1 - x) / b
+
+
+"""
+Cumulative distribution function of Student's t distribution with df degrees of freedom.
+"""
+def t_cdf(t, df):
+    tail = 0.5 * _inc_beta(df / 2, 0.5, df / (df + t * t))
+
+    return 1 - tail if 0 < t else tail
+
+
+"""
+Quantile of Student's t distribution with df degrees of freedom at probability p: in closed form for one and two
+degrees of freedom, and otherwise by inverting t_cdf with Newton steps (falling back to bisection of the bracket of the
+quantile) from the Cornish-Fisher expansion about the normal quantile (accurate to within 1e-10 relative error).
+"""
+def t_quantile(p, df):
+    if df == 1:
+        return math.tan(math.pi * (p - 0.5))
+    if df == 2:
+        return (2 * p - 1) * math.sqrt(2 / (4 * p * (1 - p)))
+    if p < 0.5:
+        return -t_quantile(1 - p, df)
+
+    z = normal_quantile(p)
+    t = z + (z**3 + z) / (4 * df) + (5 * z**5 + 16 * z**3 + 3 * z) / (96 * df**2) \
+        + (3 * z**7 + 19 * z**5 + 17 * z**3 - 15 * z) / (384 * df**3)
+
+    lo, hi = 0.0, max(t, 1.0)
+    while t_cdf(hi, df) < p:
+        hi = 2 * hi
+
+    log_norm = math.lgamma((df + 1) / 2) - math.lgamma(df / 2) - 0.5 * math.log(df * math.pi)
+    for _ in range(200):
+        f = t_cdf(t, df) - p
+        if f < 0:
+            lo = max(lo, t)
+        else:
+            hi = min(hi, t)
+
+        step = f / math.exp(log_norm - (df + 1) / 2 * math.log1p(t * t / df))
+        if abs(step) <= 1e-12 * t or hi - lo <= 1e-12 * hi:
+            break
+
+        t = t - step if lo < t - step < hi else (lo + hi) / 2
+
+    return t
+
+
+"""
+Summarises a list of samples by their mean, (sample) variance and the half-width of the confidence interval on the
+mean at the given confidence level; the variance and half-width of less than two samples are 0 and infinite.
+"""
+def mean_ci(samples, confidence=0.95):
+    n = len(samples)
+    mean = sum(samples) / n
+    if n < 2:
+        return mean, 0, math.inf
+
+    var = statistics.variance(samples, mean)
+
+    return mean, var, t_quantile((1 + confidence) / 2, n - 1) * math.sqrt(var / n)
+
+
+"""
+Fixed number of repetitions of every bias value of a sweep (ie. the serial loop repeating every bias value n times).
+"""
+class FixedRepetitions:
+    def __init__(self, n):
+        self.min_reps = n
+        self.max_reps = n
+
+    def done(self, results):
+        return self.max_reps <= len(results)
+
+
+"""
+Repetitions of every bias value of a sweep until the confidence intervals on the mean solve time of every solver and
+on the mean number of solve iterations (stats[i][4] and stats[0][6], see run_cell) are all narrower than a target
+width relative to the mean, within a minimum and maximum number of repetitions. Nearly deterministic bias values are
+thus repeated no more than the minimum number of times, while noisy ones are repeated up to the maximum.
+
+Parameters:
+  i.   min_reps : the minimum number of repetitions
+ ii.   max_reps : the maximum number of repetitions
+iii.  rel_width : the target width of the confidence intervals (ie. twice the half-width), relative to the mean
+ iv. confidence : the confidence level of the intervals
+"""
+class CIRepetitions:
+    def __init__(self, min_reps, max_reps, rel_width, confidence=0.95):
+        self.min_reps = max(2, min_reps)
+        self.max_reps = max(self.min_reps, max_reps)
+        self.rel_width = rel_width
+        self.confidence = confidence
+
+    def done(self, results):
+        if len(results) < self.min_reps:
+            return False
+        if self.max_reps <= len(results):
+            return True
+
+        series = [[r[1][i][4] for r in results] for i in range(len(results[0][1]))]
+        series.append([r[1][0][6] for r in results])
+
+        for samples in series:
+            mean, _, half_width = mean_ci(samples, self.confidence)
+            if abs(mean) * self.rel_width < 2 * half_width:
+                return False
+
+        return True
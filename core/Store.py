@@ -0,0 +1,107 @@
+from core.Instances import new_master_seed
+
+import json
+import shutil
+import sqlite3
+import hashlib
+import datetime
+
+"""
+Hash identifying a list of solver commands, over the contents of every solver binary along with its options, such
+that results obtained with a different build or configuration of a solver are never mixed up. Results obtained with
+an in-process backend (see BACKENDS) are further keyed by the backend and the maximum number of iterations, beyond which
+the in-process solver abandons a solve (such that a solve abandoned under a lower limit is never reused).
+"""
+def solver_hash(solvers, backend="external", iterations=None):
+    h = hashlib.sha256()
+    for solver in solvers:
+        path = shutil.which(solver[0]) or solver[0]
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+
+        h.update(json.dumps(solver[1:]).encode())
+
+    if backend != "external":
+        h.update(backend.encode())
+        h.update(json.dumps(iterations).encode())
+
+    return h.hexdigest()
+
+
+"""
+Persistent store of the results of the cells of analysis sweeps, as an SQLite database in which every cell is recorded
+as soon as it finishes. Cells are keyed by the number of variables n, the number of literals k, the clause generation
+cutoff and uniqueness index, the solver timeout, the bias, the repetition, the seed of the instance and the hash of the
+solvers (see solver_hash), such that a sweep interrupted at any point can be resumed by skipping the cells already
+recorded, while a run which timed out is never taken for a run with a different timeout. The master seed from which the
+seeds of instances are derived is recorded too (see master_seed). Use as a context manager.
+
+Parameters:
+  i. path : path to the database, which is created if it does not exist
+"""
+class ResultStore:
+    def __init__(self, path):
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(runs)")]
+        if columns and "timeout" not in columns:  # recorded without their timeout and index, so kept aside unused
+            self._db.execute("ALTER TABLE runs RENAME TO runs_unkeyed")
+        self._db.execute("CREATE TABLE IF NOT EXISTS runs (n INTEGER, k INTEGER, cutoff INTEGER, idx TEXT, "
+                         "timeout REAL, bias REAL, rep INTEGER, seed INTEGER, solver TEXT, n_clauses INTEGER, "
+                         "stats TEXT, finished TEXT, structure TEXT, "
+                         "PRIMARY KEY (n, k, cutoff, idx, timeout, bias, rep, seed, solver))")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._db.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    """
+    Returns the master seed of the sweeps recorded in the store. The given seed (or a fresh one if None) is recorded
+    if none is recorded yet, while an explicitly given seed always takes precedence over the recorded one.
+    """
+    def master_seed(self, seed=None):
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'seed'").fetchone()
+        if row is not None and seed is None:
+            return int(row[0])
+
+        if seed is None:
+            seed = new_master_seed()
+
+        if row is None:
+            self._db.execute("INSERT INTO meta VALUES ('seed', ?)", (str(seed),))
+            self._db.commit()
+
+        return seed
+
+    """
+    Looks up a recorded cell, returning its result (see run_cell) or None if not recorded. The summary of the dependency
+    structure of cells recorded without one is None.
+    """
+    def get(self, n, k, cutoff, index, timeout, solver, bias, rep, seed):
+        row = self._db.execute("SELECT n_clauses, stats, structure FROM runs WHERE n = ? AND k = ? AND cutoff = ? "
+                               "AND bias = ? AND idx = ? AND timeout = ? AND rep = ? AND seed = ? AND solver = ?",
+                               (n, k, cutoff, float(bias), index, float(timeout), rep, seed, solver)).fetchone()
+        if row is None:
+            return None
+
+        return row[0], json.loads(row[1]), None if row[2] is None else json.loads(row[2])
+
+    """
+    Records the result of a cell (see run_cell), committing it to disk at once.
+    """
+    def put(self, n, k, cutoff, index, timeout, solver, bias, rep, seed, result):
+        n_clauses, stats, structure = result
+        self._db.execute("INSERT OR REPLACE INTO runs (n, k, cutoff, idx, timeout, bias, rep, seed, solver, "
+                         "n_clauses, stats, finished, structure) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                         (n, k, cutoff, index, float(timeout), float(bias), rep, seed, solver, n_clauses,
+                          json.dumps(stats), datetime.datetime.now().isoformat(), json.dumps(structure)))
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
+
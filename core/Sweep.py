@@ -0,0 +1,489 @@
+import numpy as np
+
+from core.Transport import SolverInstance
+from core.Runner import default_runner
+from core.Stats import FixedRepetitions
+from core.Store import solver_hash
+from core.Metrics import InstanceMetrics, profiled
+from core.Dependency import analyse
+from core import MoserTardos
+
+import os
+import random
+import collections
+
+from concurrent.futures import Future, ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+"""
+Backends by which the instances of a sweep are solved: the configured external solvers alone, the in-process reference
+Moser-Tardos solver alone (see MoserTardos.solve), or both, in which case the reference solver is run after the external
+solvers to cross-check their iteration counts without deciding whether a cell fails.
+"""
+BACKENDS = ["external", "moser-tardos", "cross-check"]
+
+"""
+Runs a single cell of an analysis sweep, by generating (or loading) the random instance with k literals per clause
+for the bias b and repetition rep from the configured instance cache (see InstanceCache) and running each of the
+configured solvers on it in turn (the same instance serving all solvers).
+
+Parameters:
+  i.  cfg : sweep configuration (see run_sweep)
+ ii.    k : the number of literals in a clause
+iii.    b : the bias with which variables are pruned once the ALLL conditions are broken
+ iv.  rep : the repetition of the bias value, from which the seed of the instance is derived
+  v. cpus : optional list of cores allocated to the cell; the instance is generated on the first of these, and every
+            solver is pinned to as many of these as given for it in the configuration
+
+Returns the number of clauses in the instance along with the statistics of each solver run, as read from the solver's
+csv file: [0] t_read, [1] n, [2] m, [3] l, [4] t_solve, [5] n_threads, [6] n_iterations, followed by the resource usage
+of the solver process: [7] cpu_time (seconds), [8] max_rss (kilobytes). The statistics of a run which timed out (or
+left no statistics) are None, in which case no further solvers are run. Unless the backend is "external", the
+statistics of the reference solver follow those of the external solvers (if any). The summary of the dependency
+structure of the instance (see analyse) follows the statistics.
+"""
+def run_cell(cfg, k, b, rep, cpus=None):
+    affinity = None
+    if cpus is not None:
+        affinity = os.sched_getaffinity(0)
+        os.sched_setaffinity(0, cpus[:1])
+
+    metrics = InstanceMetrics(cfg.get("events"), k=k, b=b, rep=rep)
+    profiler, cell = cfg.get("profile") or (None, None)
+    if cell != (k, b, rep):
+        profiler = None
+
+    try:
+        with profiled(profiler, cfg["dir"] + "profile_k%d_b%g_r%d" % (k, b, rep), metrics):
+            seed, clauses_arr = cfg["instances"].get(k, b, rep, metrics)
+            metrics.labels["seed"] = seed
+
+            with metrics.phase("analyse"):
+                structure = analyse(clauses_arr, cfg["vars"])
+
+            stats = []
+            if cfg["solvers"]:
+                with metrics.phase("write"):
+                    instance = SolverInstance(clauses_arr, cfg["vars"], cfg["transport"], cfg["dir"],
+                                              "_analysis_" + str(os.getpid()))
+
+                try:
+                    for i, solver in enumerate(cfg["solvers"]):
+                        run = default_runner().run(instance, solver, cfg["timeout"],
+                                                   None if cpus is None else cpus[:cfg["cores"][i]])
+                        metrics.add_run(run, i)
+                        stats.append(None if run.stats is None else run.stats[0].item() + (run.cpu_time, run.max_rss))
+
+                        if run.stats is None:
+                            break
+                finally:
+                    with metrics.phase("cleanup"):
+                        instance.close()
+
+            if cfg.get("backend", "external") != "external" and None not in stats:
+                metrics.max_rss()  # the peak of the cell so far, before the reference solver resets it
+
+                # the reference solver draws from a stream of its own, derived from the seed of the instance
+                run = MoserTardos.run(clauses_arr, cfg["vars"], cfg["timeout"], cfg["iterations"], [seed, 1])
+                metrics.add_run(run, len(stats))
+                stats.append(None if run.stats is None else run.stats[0].item() + (run.cpu_time, run.max_rss))
+    finally:
+        if affinity is not None:
+            os.sched_setaffinity(0, affinity)
+
+    metrics.emit()
+
+    return len(clauses_arr), stats, structure
+
+
+"""
+A cell fails if any of its solver runs timed out or exceeded the maximum number of solve iterations; the bias at which
+a cell first fails is b_max, beyond which no further analysis is carried out. When cross-checking, only the runs of the
+external solvers decide whether a cell fails.
+"""
+def cell_failed(cfg, result):
+    stats = result[1]
+
+    return any(s is None or cfg["iterations"] < s[6] for s in stats[:len(cfg["solvers"]) or 1])
+
+
+"""
+Executor running each submitted call inline, such that a sweep with a single job runs strictly in order.
+"""
+class _InlineExecutor:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+
+        return future
+
+
+"""
+Linear search over the bias values of a sweep, evaluating every bias value in order until the first at which a cell
+fails (ie. the serial loop over biases). Bias values are referred to by their index in the sweep.
+
+Parameters:
+  i. n : the number of bias values
+"""
+class LinearSearch:
+    def __init__(self, n):
+        self.limit = n  # index of the first bias value at which a cell failed (n if none)
+        self.passed = set()  # indices of the bias values at which all cells passed
+
+    def resolved(self, i):
+        return i in self.passed or self.limit <= i
+
+    """
+    Indices of the bias values to evaluate given the results so far, in order of priority.
+    """
+    def points(self):
+        return range(self.limit)
+
+    def update(self, i, passed):
+        if passed:
+            self.passed.add(i)
+        else:
+            self.limit = min(self.limit, i)
+
+
+"""
+Adaptive search over the bias values of a sweep, locating the first bias value at which a cell fails before spending
+the remaining budget of bias values on the curve below it. The threshold is first bracketed by evaluating the bias
+values at indices 0, 1, 3, 7, 15, ... until a failure, and then located by bisection of the bracket, such that it is
+found at the resolution of the full sweep in a logarithmic number of bias values. Of the budget left, half is spent
+on the bias values immediately below the threshold and half on bias values evenly spread below it.
+
+Parameters:
+  i.      n : the number of bias values
+ ii. budget : the number of bias values to evaluate in full, including those passing while locating the threshold
+              (which are always evaluated, even if more than the budget)
+"""
+class AdaptiveSearch(LinearSearch):
+    def __init__(self, n, budget):
+        super().__init__(n)
+        self.n = n
+        self.budget = budget
+
+        self._lo = -1  # highest index known to pass, and lowest index known to fail, bracketing the threshold
+        self._hi = n
+        self._step = 1
+        self._probe = 0
+        self._refined = None
+
+    def points(self):
+        if self._refined is None:
+            return [self._probe]
+
+        return [i for i in self._refined if i < self.limit]
+
+    def update(self, i, passed):
+        super().update(i, passed)
+
+        if self._refined is not None:
+            return
+
+        if passed:
+            self._lo = max(self._lo, i)
+        else:
+            self._hi = min(self._hi, i)
+
+        if self._hi - self._lo <= 1 or self._lo == self.n - 1:  # threshold located (or beyond the last bias value)
+            self._refined = self._refine()
+        elif self._hi == self.n:  # no failure yet, so widen the bracket
+            self._probe = min(self._lo + self._step, self.n - 1)
+            self._step = 2 * self._step
+        else:
+            self._probe = (self._lo + self._hi) // 2
+
+    def _refine(self):
+        remaining = self.budget - len(self.passed)
+        candidates = [i for i in range(self.limit) if i not in self.passed]
+        if remaining <= 0 or not candidates:
+            return []
+
+        near = candidates[::-1][:(remaining + 1) // 2]
+        rest = [i for i in candidates if i not in near]
+        n_spread = min(len(rest), remaining - len(near))
+        if n_spread <= 0:
+            return near
+
+        return near + [rest[j] for j in np.unique(np.linspace(0, len(rest) - 1, n_spread).round().astype(int))]
+
+
+"""
+Creates the search over n bias values for a single k of a sweep, any of SEARCHES.
+"""
+SEARCHES = ["linear", "adaptive"]
+
+def make_search(search, n, budget):
+    if search == "adaptive":
+        return AdaptiveSearch(n, budget)
+
+    return LinearSearch(n)
+
+
+"""
+Runs an analysis sweep over the grid of (k, b, repetition) cells, on a pool of worker processes if more than one job
+is requested. For every k, the bias values to evaluate are chosen by a search (see LinearSearch and AdaptiveSearch),
+and cells are submitted for the bias values it asks for in order of priority, with at most two cells per job in flight.
+A bias value passes once all of its repetitions pass, and fails as soon as any one of them fails; the number of
+repetitions is either fixed or decided as results come in (see CIRepetitions), in which case no more than the minimum
+number of repetitions, or one more than those already passed, are in flight for a bias value at once. Pending cells for
+bias values no longer asked for (eg. beyond a failure) are then cancelled and the results of any still running are
+discarded, such that with a linear search the results are those of the serial loop over biases.
+
+If a core allocator is given, every cell is allocated a disjoint set of max(cfg["cores"]) cores for its whole
+duration, to which its solvers are pinned; cells are then only submitted while enough cores are free, and never queued.
+
+If a results store is given, every cell is recorded in it as soon as it finishes (including those whose results are
+discarded), and cells already recorded are taken from it rather than run again, such that an interrupted sweep is
+resumed by running it again with the same arguments.
+
+Parameters:
+   i.       cfg : sweep configuration; a dict holding vars, cutoff, index (the clause uniqueness index), instances (the
+                  InstanceCache of the sweep), transport, dir, solvers (list of solver commands, each run in turn on
+                  every instance), timeout and iterations, along with cores (the number of cores to pin each solver to)
+                  if an allocator is given, and optionally events (path to the event log of every cell, see
+                  InstanceMetrics) and profile (a (profiler, (k, b, rep)) pair naming the profiler with which to profile
+                  a single cell, see profiled) and backend (any of BACKENDS, "external" by default; solvers is empty for
+                  "moser-tardos")
+  ii.        ks : the values of k to analyse
+ iii.    biases : the bias values to analyse for every k, in order
+  iv.      reps : the number of repetitions for each bias value, or the rule deciding it (eg. CIRepetitions)
+   v.      jobs : the number of worker processes
+  vi. on_k_done : callback invoked as on_k_done(k, bs, results, b_max) once the search for k is done, where bs holds
+                  the bias values before b_max which passed (in order) and results the list of cell results (see
+                  run_cell) for each of these, and b_max is the first bias value which failed (0 if none failed)
+ vii. allocator : optional CoreAllocator from which cores are allocated to cells
+viii.    search : the search over bias values, any of SEARCHES
+  ix.    budget : the number of bias values evaluated in full by an adaptive search, for every k
+   x.     store : optional ResultStore in which cells are recorded
+  xi.  exporter : optional PrometheusExporter of the event log, updated as cells finish
+"""
+def run_sweep(cfg, ks, biases, reps, jobs, on_k_done, allocator=None, search="linear", budget=16, store=None,
+              exporter=None):
+    if allocator is not None and allocator.n_cpus < max(cfg["cores"]):
+        raise ValueError("Cannot allocate " + str(max(cfg["cores"])) + " cores out of " + str(allocator.n_cpus))
+
+    if isinstance(reps, int):
+        reps = FixedRepetitions(reps)
+
+    state = {k: {"search": make_search(search, len(biases), budget), "submitted": [0 for _ in biases],
+                 "results": [[] for _ in biases], "done": False} for k in ks}
+    pending = {}
+
+    solver = None if store is None else solver_hash(cfg["solvers"], cfg.get("backend", "external"), cfg["iterations"])
+
+    if jobs <= 1:
+        executor, window = _InlineExecutor(), 1
+    else:  # each worker is reseeded, such that workers do not share the random state of the parent
+        executor, window = ProcessPoolExecutor(jobs, initializer=random.seed), 2 * jobs if allocator is None else jobs
+
+    with executor:
+        while True:
+            # top up the cells in flight, from the first k (in order) whose search asks for bias values with cells
+            # left to submit
+            full = False
+            for k in ks:
+                s = state[k]
+                for bi in s["search"].points():
+                    while not full and s["submitted"][bi] < min(reps.max_reps,
+                                                                 max(reps.min_reps, len(s["results"][bi]) + 1)):
+                        rep = s["submitted"][bi]
+                        seed = cfg["instances"].seed(k, biases[bi], rep)
+                        recorded = None if store is None else store.get(cfg["vars"], k, cfg["cutoff"], cfg["index"],
+                                                                         cfg["timeout"], solver, biases[bi], rep, seed)
+                        if recorded is not None:  # taken from the store without taking up a job
+                            future = Future()
+                            future.set_result(recorded)
+                            pending[future] = (k, bi, rep, seed, None, True)
+                            s["submitted"][bi] = rep + 1
+                            continue
+
+                        cpus = None
+                        if len(pending) < window and allocator is not None:
+                            cpus = allocator.acquire(max(cfg["cores"]))
+
+                        if window <= len(pending) or (allocator is not None and cpus is None):
+                            full = True
+                            break
+
+                        pending[executor.submit(run_cell, cfg, k, biases[bi], rep, cpus)] = (k, bi, rep, seed, cpus,
+                                                                                            False)
+                        s["submitted"][bi] = rep + 1
+
+                    if full:
+                        break
+
+                if full:
+                    break
+
+            # report every k for which all bias values asked for by the search are resolved
+            for k in ks:
+                s = state[k]
+                if not s["done"] and all(s["search"].resolved(bi) for bi in s["search"].points()):
+                    s["done"] = True
+
+                    limit = s["search"].limit
+                    passed = sorted(bi for bi in s["search"].passed if bi < limit)
+                    b_max = biases[limit] if limit < len(biases) else 0
+                    on_k_done(k, [biases[bi] for bi in passed], [s["results"][bi] for bi in passed], b_max)
+
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                k, bi, rep, seed, cpus, recorded = pending.pop(future)
+                s = state[k]
+
+                if cpus is not None:
+                    allocator.release(cpus)
+
+                result = future.result()
+                if store is not None and not recorded:
+                    store.put(cfg["vars"], k, cfg["cutoff"], cfg["index"], cfg["timeout"], solver, biases[bi], rep,
+                              seed, result)
+                if exporter is not None and not recorded:
+                    exporter.update()
+
+                if s["done"] or s["search"].resolved(bi):  # discard results of bias values already resolved
+                    continue
+
+                if cell_failed(cfg, result):
+                    s["search"].update(bi, False)
+                else:
+                    s["results"][bi].append(result)
+                    if reps.done(s["results"][bi]):
+                        s["search"].update(bi, True)
+
+                # cancel any pending cells of bias values no longer asked for by the search
+                wanted = set(s["search"].points())
+                for f, (pk, pbi, _, _, pcpus, _) in list(pending.items()):
+                    if pk == k and (pbi not in wanted or s["search"].resolved(pbi)) and f.cancel():
+                        del pending[f]
+                        if pcpus is not None:
+                            allocator.release(pcpus)
+
+
+"""
+Runs a shard of an analysis sweep over the grid of (k, b, repetition) cells, ie. only the cells owned by the shard (see
+ShardLog.owns), recording every cell in the work log of the shard as soon as it finishes. Cells are run in order of k,
+bias value and repetition, on a pool of worker processes (and cores, see run_sweep) as for run_sweep. Since the shards
+do not share their results as they run, every bias value is evaluated by a linear search with a fixed number of
+repetitions: no cell is run at or beyond the lowest bias value at which a cell of the same k failed in any shard (as
+read from the work logs of all shards whenever a cell finishes), and pending cells beyond it are cancelled. Cells
+already recorded in the work log of the shard are skipped, such that an interrupted shard is resumed by running it
+again with the same arguments.
+
+The results of all shards are combined by merge_shards once every shard is done.
+
+Parameters:
+   i.       cfg : sweep configuration (see run_sweep)
+  ii.        ks : the values of k to analyse
+ iii.    biases : the bias values to analyse for every k, in order
+  iv.      reps : the number of repetitions for each bias value
+   v.      jobs : the number of worker processes
+  vi.     shard : the ShardLog of the shard
+ vii. allocator : optional CoreAllocator from which cores are allocated to cells
+viii.  exporter : optional PrometheusExporter of the event log, updated as cells finish
+"""
+def run_shard(cfg, ks, biases, reps, jobs, shard, allocator=None, exporter=None):
+    if allocator is not None and allocator.n_cpus < max(cfg["cores"]):
+        raise ValueError("Cannot allocate " + str(max(cfg["cores"])) + " cores out of " + str(allocator.n_cpus))
+
+    recorded = shard.recorded()
+    cells = collections.deque((k, bi, rep) for k in ks for bi in range(len(biases)) for rep in range(reps)
+                              if shard.owns(k, bi * reps + rep) and (k, bi, rep) not in recorded)
+    pending = {}
+
+    if jobs <= 1:
+        executor, window = _InlineExecutor(), 1
+    else:  # each worker is reseeded, such that workers do not share the random state of the parent
+        executor, window = ProcessPoolExecutor(jobs, initializer=random.seed), 2 * jobs if allocator is None else jobs
+
+    with executor:
+        while True:
+            # top up the cells in flight, skipping those at or beyond the bias value at which a cell failed
+            limits = shard.limits()
+            while cells and len(pending) < window:
+                k, bi, rep = cells[0]
+                if limits.get(k, len(biases)) <= bi:
+                    cells.popleft()
+                    continue
+
+                cpus = None
+                if allocator is not None:
+                    cpus = allocator.acquire(max(cfg["cores"]))
+                    if cpus is None:
+                        break
+
+                cells.popleft()
+                pending[executor.submit(run_cell, cfg, k, biases[bi], rep, cpus)] = (k, bi, rep, cpus)
+
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                k, bi, rep, cpus = pending.pop(future)
+                if cpus is not None:
+                    allocator.release(cpus)
+
+                result = future.result()
+                shard.record(k, bi, rep, biases[bi], cfg["instances"].seed(k, biases[bi], rep), result,
+                             cell_failed(cfg, result))
+                if exporter is not None:
+                    exporter.update()
+
+            # cancel any pending cells at or beyond the bias value at which a cell failed
+            limits = shard.limits()
+            for f, (pk, pbi, _, pcpus) in list(pending.items()):
+                if limits.get(pk, len(biases)) <= pbi and f.cancel():
+                    del pending[f]
+                    if pcpus is not None:
+                        allocator.release(pcpus)
+
+
+"""
+Merges the results of the shards of an analysis sweep (see run_shard) into the results of the serial loop over biases:
+for every k, the bias values are walked in order until the first at which any cell failed, which is b_max, such that
+on_k_done is invoked exactly as by run_sweep with a linear search. A k for which a bias value before b_max is missing
+any cell (ie. some shard is not done yet) is not reported.
+
+Parameters:
+  i.       cfg : sweep configuration (see run_sweep), of which only solvers and iterations are used
+ ii.        ks : the values of k analysed
+iii.    biases : the bias values analysed for every k, in order
+ iv.      reps : the number of repetitions for each bias value
+  v.   results : the results of every cell recorded by any shard (see ShardLog.results)
+ vi. on_k_done : callback invoked as on_k_done(k, bs, results, b_max) for every complete k (see run_sweep)
+
+Returns the values of k which are not complete yet.
+"""
+def merge_shards(cfg, ks, biases, reps, results, on_k_done):
+    incomplete = []
+    for k in ks:
+        bs, passed, b_max = [], [], 0
+        for bi, b in enumerate(biases):
+            cells = [results.get((k, bi, rep)) for rep in range(reps)]
+            if any(cell is not None and cell_failed(cfg, cell) for cell in cells):
+                b_max = b
+                break
+
+            if None in cells:
+                incomplete.append(k)
+                break
+
+            bs.append(b)
+            passed.append(cells)
+
+        if k not in incomplete:
+            on_k_done(k, bs, passed, b_max)
+
+    return incomplete
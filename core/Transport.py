@@ -0,0 +1,240 @@
+import numpy as np
+
+from core.CoreUtils import write_dimacs, to_dimacs_cnf
+from core.Runner import default_runner
+
+import os
+import sys
+import time
+import errno
+import atexit
+import shutil
+import signal
+import datetime
+import tempfile
+
+TRANSPORTS = ["auto", "stdin", "fifo", "tmpfs", "disk"]
+
+_selected = {}  # transport selected by select_transport, per solver command
+
+_RUN_DIR = "RANDOMSATGEN_RUN_DIR"  # environment variable through which worker processes find the run's directory
+_run_dir = None
+
+"""
+RAM-backed directory in which to place instances, or None if no such directory is available.
+"""
+def ram_dir():
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+
+    return None
+
+
+def _remove_run_dir(path, pid):
+    if os.getpid() == pid:  # not in any worker process forked since
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def _terminate(signum, frame):
+    sys.exit(128 + signum)
+
+
+"""
+Directory of the current run, in RAM if available, under which the temporary directory of every instance is created.
+It is created by the first process of the run to need it and passed on to the worker processes started after it
+(through the environment), and removed on exit by the process which created it, such that no instance is left behind in
+RAM by a run which is interrupted (including by SIGTERM, which is turned into a normal exit unless already handled).
+"""
+def run_dir():
+    global _run_dir
+
+    if _run_dir is None:
+        inherited = os.environ.get(_RUN_DIR)
+        if inherited is not None and os.path.isdir(inherited):
+            _run_dir = inherited
+        else:
+            _run_dir = tempfile.mkdtemp(prefix="RandomSATGen_", dir=ram_dir())
+            os.environ[_RUN_DIR] = _run_dir
+            atexit.register(_remove_run_dir, _run_dir, os.getpid())
+
+            if signal.getsignal(signal.SIGTERM) == signal.SIG_DFL:
+                try:
+                    signal.signal(signal.SIGTERM, _terminate)
+                except ValueError:  # not in the main thread
+                    pass
+
+    return _run_dir
+
+
+"""
+A generated SAT instance made available to a solver through one of the following transports:
+  i. stdin : the DIMACS stream is piped to the solver's standard input, through a path symlinked to /dev/stdin
+ ii.  fifo : the DIMACS stream is written to a named pipe, as the solver reads it
+iii. tmpfs : the DIMACS file is written to a temporary directory in RAM
+ iv.  disk : the DIMACS file is written to the given directory
+
+The stdin and fifo transports never place the instance on any file system, but require a solver reading the instance
+sequentially in a single pass; they are written again for each run of the solver. The solver's statistics files are
+placed next to the instance, in a temporary directory in RAM (see run_dir) for all but the disk transport. Solvers
+are run on the instance by a SolverRunner, leaving their output files in place until the next run, keep() or close().
+Use as a context manager, such that all files related to the instance are removed on exit (unless moved elsewhere by
+keep()).
+
+Parameters:
+  i.          clauses : (m, k) array of generated random clauses
+ ii.           n_vars : number of variables in instance
+iii.             mode : transport through which the instance is passed to the solver (any of TRANSPORTS but "auto")
+ iv.              dir : directory at which to persist the instance for the disk transport
+  v. file_name_suffix : optional argument providing suffix to name of instance
+"""
+class SolverInstance:
+    def __init__(self, clauses, n_vars, mode, dir, file_name_suffix=""):
+        self.clauses = clauses
+        self.n_vars = n_vars
+        self.mode = mode
+        self.gen_time = datetime.datetime.now()
+        self.file_name_suffix = file_name_suffix
+        self._kept = False
+
+        if mode == "disk":
+            self._tmp_dir = None
+            self.cnf_file_name = to_dimacs_cnf(clauses, n_vars, dir, file_name_suffix, gen_time=self.gen_time)
+        else:
+            self._tmp_dir = tempfile.mkdtemp(prefix="instance_", dir=run_dir())
+            work_dir = self._tmp_dir + "/"
+
+            if mode == "tmpfs":
+                self.cnf_file_name = to_dimacs_cnf(clauses, n_vars, work_dir, file_name_suffix, gen_time=self.gen_time)
+            else:
+                self.cnf_file_name = work_dir + "rand_cnf_" + self.gen_time.strftime("%d_%m_%Y_%H_%M_%S") \
+                                     + file_name_suffix
+
+                if mode == "fifo":
+                    os.mkfifo(self.cnf_file_name + ".cnf")
+                else:
+                    os.symlink("/dev/stdin", self.cnf_file_name + ".cnf")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    """
+    Path of the instance to pass to the solver.
+    """
+    @property
+    def path(self):
+        return self.cnf_file_name + ".cnf"
+
+    def _open_fifo(self, proc):
+        while True:  # wait for the solver to open the named pipe for reading, unless it exits before doing so
+            try:
+                fd = os.open(self.path, os.O_WRONLY | os.O_NONBLOCK)
+                break
+            except OSError as e:
+                # the solver is checked for having exited without reaping it, which is left to the solver's runner
+                if e.errno != errno.ENXIO or os.waitid(os.P_PID, proc.pid, os.WEXITED | os.WNOHANG | os.WNOWAIT):
+                    return None
+
+                time.sleep(0.001)
+
+        os.set_blocking(fd, True)
+
+        return os.fdopen(fd, "wb", buffering=1 << 20)
+
+    """
+    Writes the instance to a solver run through the stdin or fifo transports, as the solver reads it.
+    """
+    def feed(self, proc):
+        try:
+            cnf_file = proc.stdin if self.mode == "stdin" else self._open_fifo(proc)
+            if cnf_file is None:
+                return
+
+            with cnf_file:
+                write_dimacs(cnf_file, self.clauses, self.n_vars, self.gen_time)
+        except OSError:  # the solver exited (or was killed) before reading the whole instance
+            pass
+
+    def remove_outputs(self):
+        for ext in [".csv", ".out"]:
+            if os.path.exists(self.cnf_file_name + ext):
+                os.remove(self.cnf_file_name + ext)
+
+    """
+    Persists the instance, along with the solver's output files, to the given directory and returns the name of the
+    CNF file (without extension); the persisted files are not removed by close().
+    """
+    def keep(self, dir):
+        self._kept = True
+        if self.mode == "disk":
+            return self.cnf_file_name
+
+        if self.mode == "tmpfs":
+            cnf_file_name = dir + os.path.basename(self.cnf_file_name)
+            shutil.move(self.path, cnf_file_name + ".cnf")
+        else:
+            cnf_file_name = to_dimacs_cnf(self.clauses, self.n_vars, dir, self.file_name_suffix, gen_time=self.gen_time)
+
+        self.keep_outputs(cnf_file_name)
+
+        return cnf_file_name
+
+    """
+    Persists the solver's output files alone, under the given name (without extension); the persisted files are not
+    removed by close(), unlike the instance itself (unless kept by keep()).
+    """
+    def keep_outputs(self, cnf_file_name):
+        for ext in [".csv", ".out"]:
+            if os.path.exists(self.cnf_file_name + ext):
+                shutil.move(self.cnf_file_name + ext, cnf_file_name + ext)
+
+        if self._kept:
+            self.cnf_file_name = cnf_file_name
+
+    """
+    Removes all files related to the instance (tolerating any which do not exist).
+    """
+    def close(self):
+        if self._tmp_dir is not None:
+            shutil.rmtree(self._tmp_dir, ignore_errors=True)
+            self._tmp_dir = None
+        elif self.mode == "disk" and not self._kept and self.cnf_file_name is not None:
+            self.remove_outputs()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+        self.cnf_file_name = None
+
+
+"""
+Resolves the transport to use for a solver. Unless a specific transport is requested, the fastest transport supported
+by the solver is selected by solving a trivial instance through the stdin and fifo transports in turn, falling back to
+tmpfs if a RAM-backed directory is available or to disk otherwise. The selection is made once per solver command. The
+directory of the run (see run_dir) is created here, before any worker process is started, such that all share it.
+
+Parameters:
+  i.    mode : requested transport, any of TRANSPORTS
+ ii.  solver : solver command (path to the solver along with any arguments)
+iii.     dir : directory at which instances are persisted for the disk transport
+"""
+def select_transport(mode, solver, dir):
+    run_dir()
+    if mode != "auto":
+        return mode
+
+    key = tuple(solver)
+    if key not in _selected:
+        _selected[key] = "disk" if ram_dir() is None else "tmpfs"
+
+        for candidate in ["stdin", "fifo"]:
+            try:
+                with SolverInstance(np.array([[1, 2, 3]], dtype=np.int32), 3, candidate, dir, "_probe") as instance:
+                    if default_runner().run(instance, solver, 10).stats is not None:
+                        _selected[key] = candidate
+                        break
+            except (OSError, ValueError):  # eg. no statistics produced, or unsupported by the platform
+                pass
+
+    return _selected[key]